@@ -1,10 +1,49 @@
 import anthropic
+import orjson
 import os
+import re
+import time
+import asyncio
+import json
+import hashlib
+import logging
+import functools
+import threading
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 from dotenv import load_dotenv
 
+import db
+
 load_dotenv()
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+logger = logging.getLogger("ai")
+
+# One pooled HTTP/2 connection set per client so bursts of parallel calls
+# reuse TCP+TLS instead of handshaking each time
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+client = anthropic.Anthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=anthropic.DefaultHttpxClient(http2=True, limits=_HTTP_LIMITS),
+)
+aclient = anthropic.AsyncAnthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=anthropic.DefaultAsyncHttpxClient(http2=True, limits=_HTTP_LIMITS),
+)
+
+# Caps concurrent async Claude calls across the process
+_async_limit = asyncio.Semaphore(5)
+
+# Sonnet for answers and final synthesis; Haiku for extraction-style calls
+# (recommendations, tag/type analysis, per-section map summaries).
+MODEL_SMART = "claude-sonnet-4-5-20250929"
+MODEL_CHEAP = "claude-haiku-4-5-20251001"
+
+# Prompt caching: blocks marked ephemeral become cache breakpoints. Keep the
+# order system -> document context -> question so the stable prefix is reused.
+_EPHEMERAL = {"type": "ephemeral"}
 
 SYSTEM_PROMPT = """You are an advanced AI document intelligence engine.
 
@@ -39,132 +78,415 @@ Additional instruction: Write in a natural spoken tone suitable for voice narrat
 Avoid markdown symbols like **, ##, or bullet characters.
 Keep the flow conversational and easy to listen to."""
 
+ANALYSIS_SYSTEM = "You are a document analysis engine. Return only valid JSON."
+
+
+def _system_blocks(prompt: str, voice_mode: bool = False) -> list[dict]:
+    """Build the system prompt as content blocks with the stable part cacheable."""
+    blocks = [{"type": "text", "text": prompt, "cache_control": _EPHEMERAL}]
+    if voice_mode:
+        blocks.append({"type": "text", "text": VOICE_ADDENDUM})
+    return blocks
+
+
+def _context_block(text: str) -> dict:
+    """Wrap document context as a cacheable user content block."""
+    return {"type": "text", "text": text, "cache_control": _EPHEMERAL}
+
+
+def _log_cache_usage(label: str, response) -> None:
+    """Log prompt-cache hits/writes reported by the API."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    logger.info(
+        f"[{label}] model={getattr(response, 'model', '?')} input={usage.input_tokens} "
+        f"cache_read={getattr(usage, 'cache_read_input_tokens', 0) or 0} "
+        f"cache_write={getattr(usage, 'cache_creation_input_tokens', 0) or 0}"
+    )
+
+
+# Exact-match response cache: key -> (expires_at, response). Shared by the
+# AnyIO worker threads and the map-step pool, so access goes through the lock.
+_response_cache: dict[str, tuple[float, object]] = {}
+_response_cache_lock = threading.Lock()
+_RESPONSE_CACHE_MAX = 512
+QA_CACHE_TTL = 60 * 60  # 1 hour for Q&A
+DOC_CACHE_TTL = 24 * 60 * 60  # 24 hours for summaries / recommendations / analysis
+
+
+# Bump whenever a prompt or result format changes so persisted results are regenerated
+PROMPT_VERSION = 2
+
+
+def _response_cache_key(kind: str, chunks: list[dict], *parts) -> str:
+    """Hash the model, call kind, extra args and a fingerprint of the chunks."""
+    fingerprint = hashlib.sha1("".join(c["text"] for c in chunks).encode()).hexdigest()
+    raw = json.dumps([PROMPT_VERSION, MODEL_SMART, MODEL_CHEAP, kind, *parts, [c["page"] for c in chunks], fingerprint])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _cache_get(key: str):
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            _response_cache.pop(key, None)
+            return None
+        return value
+
+
+def _cache_put(key: str, value, ttl: int) -> None:
+    with _response_cache_lock:
+        if key not in _response_cache and len(_response_cache) >= _RESPONSE_CACHE_MAX:
+            # Evict the oldest insertion
+            _response_cache.pop(next(iter(_response_cache)))
+        _response_cache[key] = (time.time() + ttl, value)
+
+
+# Document-level results (summaries, analyses) never change for the same
+# content, so they are also persisted in Supabase and survive restarts.
+# The key is derived from the page text, i.e. the PDF content, not the user.
+
+def _stored_get(key: str):
+    value = _cache_get(key)
+    if value is not None:
+        return value
+    try:
+        value = db.get_ai_result(key)
+    except Exception as e:
+        logger.warning(f"[ai] Stored result lookup failed: {e}")
+        return None
+    if value is not None:
+        _cache_put(key, value, DOC_CACHE_TTL)
+    return value
+
+
+def _stored_put(key: str, kind: str, value) -> None:
+    _cache_put(key, value, DOC_CACHE_TTL)
+    try:
+        db.save_ai_result(key, kind, value)
+    except Exception as e:
+        logger.warning(f"[ai] Persisting {kind} result failed: {e}")
+
+
+def _by_page(chunks: list[dict]) -> list[dict]:
+    """Order chunks by page so identical chunk sets yield identical prompts/cache keys."""
+    return sorted(chunks, key=lambda c: c["page"])
+
 
 def format_chunks(chunks: list[dict]) -> str:
-    """Format page chunks into context string."""
-    parts = []
-    for chunk in chunks:
-        parts.append(f"--- Page {chunk['page']} ---\n{chunk['text']}")
-    return "\n\n".join(parts)
+    """Format page chunks into context string, in page order."""
+    return _format_chunks_cached(tuple((c["page"], c["text"]) for c in _by_page(chunks)))
 
 
-def ask_question(chunks: list[dict], question: str, voice_mode: bool = False) -> str:
-    """Ask a question about the document using Claude."""
+@functools.lru_cache(maxsize=256)
+def _format_chunks_cached(chunks: tuple[tuple[int, str], ...]) -> str:
+    # A list (not a generator) lets join size the result in one pass
+    return "\n\n".join([f"--- Page {page} ---\n{text}" for page, text in chunks])
+
+
+def _ask_params(chunks: list[dict], question: str, voice_mode: bool) -> dict:
     context = format_chunks(chunks)
-    system = SYSTEM_PROMPT + (VOICE_ADDENDUM if voice_mode else "")
 
-    user_message = f"""Here is the relevant document context:
+    context_message = f"""Here is the relevant document context:
 
 ---
 {context}
----
+---"""
 
-User Question:
+    question_message = f"""User Question:
 {question}
 
 Answer using ONLY the context above.
 If information is missing, say so clearly."""
 
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=2048,
-        system=system,
-        messages=[{"role": "user", "content": user_message}],
-    )
-    return response.content[0].text
+    return {
+        "model": MODEL_SMART,
+        "max_tokens": 2048,
+        "system": _system_blocks(SYSTEM_PROMPT, voice_mode),
+        "messages": [{"role": "user", "content": [
+            _context_block(context_message),
+            {"type": "text", "text": question_message},
+        ]}],
+    }
 
 
-def summarize_document(pages: list[dict], voice_mode: bool = False) -> str:
-    """Generate a structured summary of the document. Samples pages for large docs."""
-    # For large documents, sample key pages to stay within token limits
-    MAX_PAGES = 30
-    if len(pages) > MAX_PAGES:
-        # Take first 10, last 5, and evenly spaced middle pages
-        step = max(1, (len(pages) - 15) // 15)
-        middle = pages[10:-5:step][:15]
-        sampled = pages[:10] + middle + pages[-5:]
-        note = f"(Note: This document has {len(pages)} pages. Summary is based on a representative sample of {len(sampled)} pages.)\n\n"
-    else:
-        sampled = pages
-        note = ""
+def _ask_cache_key(chunks: list[dict], question: str, voice_mode: bool) -> str:
+    return _response_cache_key("ask", _by_page(chunks), voice_mode, question)
 
-    context = format_chunks(sampled)
-    system = SYSTEM_PROMPT + (VOICE_ADDENDUM if voice_mode else "")
 
-    user_message = f"""Here is the document content:
+def ask_question(chunks: list[dict], question: str, voice_mode: bool = False) -> str:
+    """Ask a question about the document using Claude."""
+    cache_key = _ask_cache_key(chunks, question, voice_mode)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = client.messages.create(**_ask_params(chunks, question, voice_mode))
+    _log_cache_usage("ask", response)
+    answer = response.content[0].text
+    _cache_put(cache_key, answer, QA_CACHE_TTL)
+    return answer
 
----
-{context}
----
 
-Please provide a comprehensive summary of this document following your summarization format:
+def ask_question_stream(chunks: list[dict], question: str, voice_mode: bool = False) -> Iterator[str]:
+    """Like ask_question, but yields text deltas as Claude generates them.
+
+    Cache hits are yielded as a single piece.
+    """
+    cache_key = _ask_cache_key(chunks, question, voice_mode)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    with client.messages.stream(**_ask_params(chunks, question, voice_mode)) as stream:
+        for text in stream.text_stream:
+            parts.append(text)
+            yield text
+        _log_cache_usage("ask", stream.get_final_message())
+    _cache_put(cache_key, "".join(parts), QA_CACHE_TTL)
+
+
+# Hard cap on prompt size. Page-count sampling alone can still overshoot on
+# dense pages, so large prompts are measured with the token-counting API.
+INPUT_TOKEN_BUDGET = 150_000
+# Below this many characters a prompt cannot reach the budget, so the counting
+# round-trip is skipped. CJK text, code and numeric tables run at 1-2 chars per
+# token (some CJK characters take more than one), hence the 2x headroom.
+_BUDGET_CHECK_MIN_CHARS = INPUT_TOKEN_BUDGET // 2
+
+
+def _fit_to_budget(pages: list[dict], build_params) -> dict:
+    """Return build_params(pages), truncating page text until it fits INPUT_TOKEN_BUDGET."""
+    params = build_params(pages)
+    if sum(len(p["text"]) for p in pages) < _BUDGET_CHECK_MIN_CHARS:
+        return params
+    for _ in range(3):
+        tokens = client.messages.count_tokens(
+            model=params["model"], system=params["system"], messages=params["messages"]
+        ).input_tokens
+        if tokens <= INPUT_TOKEN_BUDGET:
+            break
+        # Shrink every page by the same factor (with headroom) to keep coverage
+        scale = INPUT_TOKEN_BUDGET / tokens * 0.95
+        logger.info(f"[budget] {tokens} input tokens over budget, trimming pages to {scale:.0%}")
+        pages = [{**p, "text": p["text"][: int(len(p["text"]) * scale)]} for p in pages]
+        params = build_params(pages)
+    return params
+
+
+# Documents longer than this are summarized map-reduce style: each section
+# of MAP_SECTION_PAGES pages is summarized by the cheap model in parallel,
+# then one reduce call writes the final structured summary.
+SUMMARY_MAX_PAGES = 30
+MAP_SECTION_PAGES = 10
+MAP_MAX_CONCURRENCY = 10
+
+MAP_SYSTEM = """You summarize one section of a longer document.
+Be faithful and concise. Keep key facts, arguments, names, definitions and page numbers.
+Never add information that is not in the section."""
+
+SUMMARY_INSTRUCTIONS = """Please provide a comprehensive summary of this document following your summarization format:
 1. Executive Summary (2-3 sentences)
 2. Section Breakdown
 3. Key Insights
 4. Actionable Points (if applicable)"""
 
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=4096,
-        system=system,
-        messages=[{"role": "user", "content": user_message}],
-    )
-    return note + response.content[0].text
 
+def _sections(pages: list[dict]) -> list[list[dict]]:
+    return [pages[i:i + MAP_SECTION_PAGES] for i in range(0, len(pages), MAP_SECTION_PAGES)]
+
+
+def _section_label(section: list[dict]) -> str:
+    return f"Pages {section[0]['page']}-{section[-1]['page']}"
+
+
+def _map_params(section: list[dict]) -> dict:
+    context_message = f"""Section of the document ({_section_label(section)}):
+
+---
+{format_chunks(section)}
+---"""
+    return {
+        "model": MODEL_CHEAP,
+        "max_tokens": 512,
+        "system": _system_blocks(MAP_SYSTEM),
+        # Each section is sent once and memoized locally, so a cache write
+        # (billed at a premium) would never be read back
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": context_message},
+            {"type": "text", "text": "Summarize this section in at most 200 words."},
+        ]}],
+    }
+
+
+def _reduce_params(partials: list[tuple[str, str]], total_pages: int, voice_mode: bool) -> dict:
+    """Params for the final summary written from (section label, section summary) pairs."""
+    body = "\n\n".join(f"--- {label} ---\n{text}" for label, text in partials)
+    context_message = f"""Here are summaries of consecutive sections of a {total_pages}-page document:
+
+---
+{body}
+---"""
+    return {
+        "model": MODEL_SMART,
+        "max_tokens": 4096,
+        "system": _system_blocks(SYSTEM_PROMPT, voice_mode),
+        # One-off prompt whose result is memoized; not worth a cache write
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": context_message},
+            {"type": "text", "text": SUMMARY_INSTRUCTIONS},
+        ]}],
+    }
+
+
+def _summarize_section(section: list[dict]) -> str:
+    """Map step, memoized per section content so re-summarizing only redoes changed sections."""
+    cache_key = _response_cache_key("summary-map", section)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    response = client.messages.create(**_map_params(section))
+    text = response.content[0].text
+    _cache_put(cache_key, text, DOC_CACHE_TTL)
+    return text
 
-def recommend_books(pages: list[dict], voice_mode: bool = False) -> str:
-    """Recommend related books based on the document's topics."""
-    # Use first ~15 pages to understand the document's topic
-    sample = pages[:15]
-    context = format_chunks(sample)
-    system = SYSTEM_PROMPT + (VOICE_ADDENDUM if voice_mode else "")
 
-    user_message = f"""Here is a sample from a document the user uploaded:
+def _summary_params(pages: list[dict], voice_mode: bool) -> dict:
+    """Build the Messages API params for a single-call summary, within the token budget."""
+    return _fit_to_budget(pages, lambda p: _summary_prompt(p, voice_mode))
+
+
+def _summary_prompt(pages: list[dict], voice_mode: bool) -> dict:
+    context = format_chunks(pages)
+
+    context_message = f"""Here is the document content:
 
 ---
 {context}
+---"""
+
+    return {
+        "model": MODEL_SMART,
+        "max_tokens": 4096,
+        "system": _system_blocks(SYSTEM_PROMPT, voice_mode),
+        "messages": [{"role": "user", "content": [
+            _context_block(context_message),
+            {"type": "text", "text": SUMMARY_INSTRUCTIONS},
+        ]}],
+    }
+
+
+def summarize_document(pages: list[dict], voice_mode: bool = False) -> str:
+    """Generate a structured summary of the document. Long docs are summarized map-reduce style."""
+    cache_key = _response_cache_key("summarize", pages, voice_mode)
+    cached = _stored_get(cache_key)
+    if cached is not None:
+        return cached
+
+    if len(pages) <= SUMMARY_MAX_PAGES:
+        params = _summary_params(pages, voice_mode)
+    else:
+        sections = _sections(pages)
+        with ThreadPoolExecutor(max_workers=MAP_MAX_CONCURRENCY) as pool:
+            texts = list(pool.map(_summarize_section, sections))
+        params = _reduce_params(
+            [(_section_label(sec), text) for sec, text in zip(sections, texts)], len(pages), voice_mode
+        )
+
+    response = client.messages.create(**params)
+    _log_cache_usage("summarize", response)
+    summary = response.content[0].text
+    _stored_put(cache_key, "summarize", summary)
+    return summary
+
+
+def _recommend_params(sample: list[dict], voice_mode: bool) -> dict:
+    context = format_chunks(sample)
+
+    context_message = f"""Here is a sample from a document the user uploaded:
+
 ---
+{context}
+---"""
 
-Based on the topics and themes in this document, recommend 5-8 books that the reader would likely enjoy or find useful. For each book provide:
+    instructions = """Based on the topics and themes in this document, recommend 5-8 books that the reader would likely enjoy or find useful. For each book provide:
 - Title and Author
 - A 1-2 sentence description of why it's relevant
 - How it complements or extends the ideas in the uploaded document
 
 Focus on well-known, highly-rated books in similar subject areas."""
 
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=2048,
-        system=system,
-        messages=[{"role": "user", "content": user_message}],
-    )
-    return response.content[0].text
+    return {
+        "model": MODEL_CHEAP,
+        "max_tokens": 2048,
+        "system": _system_blocks(SYSTEM_PROMPT, voice_mode),
+        "messages": [{"role": "user", "content": [
+            _context_block(context_message),
+            {"type": "text", "text": instructions},
+        ]}],
+    }
 
 
-def analyze_document(pages: list[dict], known_chapters: list[dict] | None = None) -> dict:
-    """Analyze document to extract TOC, important pages, and book type using Claude.
-
-    If known_chapters are provided (from PDF bookmarks or text heuristics),
-    AI skips chapter detection and focuses on importance/tags/type only.
-    """
-    # Sample pages for large docs
+def recommend_books(pages: list[dict], voice_mode: bool = False) -> str:
+    """Recommend related books based on the document's topics."""
+    # Use first ~15 pages to understand the document's topic
+    sample = pages[:15]
+    cache_key = _response_cache_key("recommend", sample, voice_mode)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = client.messages.create(**_recommend_params(sample, voice_mode))
+    _log_cache_usage("recommend", response)
+    recommendations = response.content[0].text
+    _cache_put(cache_key, recommendations, DOC_CACHE_TTL)
+    return recommendations
+
+
+def _analysis_sample(pages: list[dict]) -> list[dict]:
+    # Sample pages for large docs. The sample is a pure function of the page
+    # list (fixed slices, page order preserved), so repeat calls produce a
+    # byte-identical prompt prefix and keep hitting the prompt and response caches.
     MAX_PAGES = 40
     if len(pages) > MAX_PAGES:
         step = max(1, (len(pages) - 15) // 25)
         middle = pages[10:-5:step][:25]
-        sampled = pages[:10] + middle + pages[-5:]
-    else:
-        sampled = pages
+        return pages[:10] + middle + pages[-5:]
+    return pages
+
+
+def _analysis_cache_key(pages: list[dict], known_chapters: list[dict] | None) -> str:
+    return _response_cache_key("analyze", _analysis_sample(pages), len(pages), known_chapters)
 
+
+def _analysis_params(pages: list[dict], known_chapters: list[dict] | None) -> dict:
+    """Build the Messages API params for a document analysis, within the token budget."""
+    return _fit_to_budget(
+        _analysis_sample(pages),
+        lambda sampled: _analysis_prompt(sampled, len(pages), known_chapters),
+    )
+
+
+def _analysis_prompt(sampled: list[dict], total_pages: int, known_chapters: list[dict] | None) -> dict:
     context = format_chunks(sampled)
+    context_message = f"""Document ({total_pages} total pages):
+
+---
+{context}
+---"""
 
     # If we already have good chapter data, ask AI for everything else only
     chapters_already_found = known_chapters and len(known_chapters) >= 3
 
     if chapters_already_found:
-        import json as _json
-        chapters_json = _json.dumps(known_chapters[:30], indent=2)
-        user_message = f"""Analyze this document and return a JSON object. The table of contents / chapters have already been extracted from the PDF structure:
+        chapters_json = json.dumps(known_chapters[:30], indent=2)
+        instructions = f"""Analyze the document above and return a JSON object. The table of contents / chapters have already been extracted from the PDF structure:
 
 {chapters_json}
 
@@ -180,21 +502,14 @@ Return a JSON object with:
 Rules:
 - Do NOT include a "chapters" field — chapters are already known.
 - For important_pages: rank the top 5-10 most important/insightful pages. Focus on key arguments, conclusions, definitions, or turning points.
-- Return ONLY valid JSON, no markdown fences, no explanation.
-
-Document ({len(pages)} total pages):
-
----
-{context}
----"""
+- Return ONLY valid JSON, no markdown fences, no explanation."""
     else:
         # Include any sparse hints if available
         hints = ""
         if known_chapters:
-            import json as _json
-            hints = f"\nSome chapter headings were detected: {_json.dumps(known_chapters)}\nUse these as hints but find additional chapters.\n"
+            hints = f"\nSome chapter headings were detected: {json.dumps(known_chapters)}\nUse these as hints but find additional chapters.\n"
 
-        user_message = f"""Analyze this document and return a JSON object with the following structure:
+        instructions = f"""Analyze the document above and return a JSON object with the following structure:
 
 {{
   "book_type": "string - one of: textbook, novel, research-paper, manual, report, essay, reference, self-help, biography, other",
@@ -211,39 +526,95 @@ Rules:
 - For chapters: identify table of contents, chapter headings, major section breaks. Include page numbers.
 - For important_pages: rank the top 5-10 most important/insightful pages. Focus on key arguments, conclusions, definitions, or turning points.
 - Return ONLY valid JSON, no markdown fences, no explanation.
-{hints}
-Document ({len(pages)} total pages):
-
----
-{context}
----"""
-
-    import json as _json
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=2048,
-        system="You are a document analysis engine. Return only valid JSON.",
-        messages=[{"role": "user", "content": user_message}],
-    )
-    text = response.content[0].text.strip()
-    # Strip markdown fences if present
+{hints}"""
+
+    return {
+        # Tags/type/important pages are extraction; finding chapters needs Sonnet
+        "model": MODEL_CHEAP if chapters_already_found else MODEL_SMART,
+        "max_tokens": 2048,
+        "system": _system_blocks(ANALYSIS_SYSTEM),
+        "messages": [{"role": "user", "content": [
+            _context_block(context_message),
+            {"type": "text", "text": instructions},
+        ]}],
+    }
+
+
+def _parse_analysis(text: str, known_chapters: list[dict] | None) -> dict:
+    """Parse the model's JSON analysis, injecting already-known chapters."""
+    text = text.strip()
+    # Strip markdown fences if present: keep what lies between the opening
+    # fence line and the last ``` in one slice (JSON parsers skip whitespace)
     if text.startswith("```"):
-        text = text.split("\n", 1)[1] if "\n" in text else text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
+        start = text.find("\n") + 1 or 3
+        end = text.rfind("```")
+        text = text[start:end] if end >= start else text[start:]
     try:
-        result = _json.loads(text)
-    except _json.JSONDecodeError:
-        result = {"book_type": "other", "tags": [], "chapters": [], "important_pages": []}
+        result = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # orjson is strict (e.g. no NaN); give the stdlib parser a chance
+        try:
+            result = json.loads(text)
+        except json.JSONDecodeError:
+            result = {"book_type": "other", "tags": [], "chapters": [], "important_pages": []}
 
     # If chapters were already known, inject them into the result
-    if chapters_already_found:
+    if known_chapters and len(known_chapters) >= 3:
         result["chapters"] = [{"title": c["title"], "page": c["page"]} for c in known_chapters]
 
     return result
 
 
+def analyze_document(pages: list[dict], known_chapters: list[dict] | None = None) -> dict:
+    """Analyze document to extract TOC, important pages, and book type using Claude.
+
+    If known_chapters are provided (from PDF bookmarks or text heuristics),
+    AI skips chapter detection and focuses on importance/tags/type only.
+    """
+    cache_key = _analysis_cache_key(pages, known_chapters)
+    cached = _stored_get(cache_key)
+    if cached is not None:
+        # Callers annotate the result in place, so hand out a copy
+        return {**cached}
+
+    response = client.messages.create(**_analysis_params(pages, known_chapters))
+    return _finish_analysis(cache_key, response, known_chapters)
+
+
+def analysis_result_key(pages: list[dict], known_chapters: list[dict] | None = None) -> str:
+    """Key under which analyze_document persists its result for these inputs."""
+    return _analysis_cache_key(pages, known_chapters)
+
+
+def stored_analysis(result_key: str) -> dict | None:
+    """A persisted analyze_document result by key (a copy), or None."""
+    cached = _stored_get(result_key)
+    return {**cached} if cached is not None else None
+
+
+def _finish_analysis(cache_key: str, message, known_chapters: list[dict] | None) -> dict:
+    """Parse and persist an analysis response (sync or async); returns a copy."""
+    _log_cache_usage("analyze", message)
+    result = _parse_analysis(message.content[0].text, known_chapters)
+    _stored_put(cache_key, "analyze", result)
+    return {**result}
+
+
+# --- Async variant (same cache and parsing, AsyncAnthropic transport) ---
+
+async def analyze_document_async(pages: list[dict], known_chapters: list[dict] | None = None) -> dict:
+    """Async analyze_document sharing the same response cache."""
+    cache_key = _analysis_cache_key(pages, known_chapters)
+    cached = await asyncio.to_thread(_stored_get, cache_key)
+    if cached is not None:
+        return {**cached}
+
+    params = await asyncio.to_thread(_analysis_params, pages, known_chapters)
+    async with _async_limit:
+        response = await aclient.messages.create(**params)
+    return await asyncio.to_thread(_finish_analysis, cache_key, response, known_chapters)
+
+
 NARRATOR_SYSTEM = """You are a professional narrator and document reader.
 
 Your tasks:
@@ -259,21 +630,33 @@ Your tasks:
 - Output should be ready to feed directly into a TTS engine like Coqui TTS, Edge TTS, or ElevenLabs."""
 
 
+# Precompiled TTS cleanup passes (order matters, see clean_text_for_tts)
+_TTS_MARKDOWN = str.maketrans("", "", "#*_`~[]")
+_TTS_BULLET_RE = re.compile(r'^[\-•●◦▪]\s*', re.MULTILINE)
+_TTS_PARAGRAPH_RE = re.compile(r'\n{2,}')
+_TTS_SPACES_RE = re.compile(r' {2,}')
+_TTS_PERIODS_RE = re.compile(r'\.{2,}')
+_TTS_SENTENCE_RE = re.compile(r'([a-zA-Z0-9])\. ([A-Z])')
+
+
 def clean_text_for_tts(text: str) -> str:
     """Clean raw PDF text for browser TTS — no AI needed."""
-    import re
     # Remove markdown-style formatting
-    text = re.sub(r'[#*_`~\[\]]', '', text)
+    text = text.translate(_TTS_MARKDOWN)
     # Remove bullet characters
-    text = re.sub(r'^[\-•●◦▪]\s*', '', text, flags=re.MULTILINE)
-    # Collapse multiple newlines into sentence breaks
-    text = re.sub(r'\n{2,}', '. ', text)
-    # Replace single newlines (mid-paragraph) with space
-    text = re.sub(r'\n', ' ', text)
+    text = _TTS_BULLET_RE.sub('', text)
+    # Collapse multiple newlines into sentence breaks, then join mid-paragraph lines.
+    # The substring checks below are a single C-level scan and let the common
+    # case skip a regex pass (and its string copy) entirely.
+    if '\n\n' in text:
+        text = _TTS_PARAGRAPH_RE.sub('. ', text)
+    text = text.replace('\n', ' ')
     # Collapse multiple spaces
-    text = re.sub(r' {2,}', ' ', text)
+    if '  ' in text:
+        text = _TTS_SPACES_RE.sub(' ', text)
     # Clean up double periods
-    text = re.sub(r'\.{2,}', '.', text)
+    if '..' in text:
+        text = _TTS_PERIODS_RE.sub('.', text)
     # Add period after lines that don't end with punctuation
-    text = re.sub(r'([a-zA-Z0-9])\. ([A-Z])', r'\1.\n\n\2', text)
+    text = _TTS_SENTENCE_RE.sub(r'\1.\n\n\2', text)
     return text.strip()
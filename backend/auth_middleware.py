@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
 import logging
+import threading
+import time
 
 from fastapi import HTTPException, Request
 
@@ -7,6 +11,37 @@ import db
 
 logger = logging.getLogger("auth")
 
+# Verified-token cache: sha256(token) -> (expires_at, decoded claims).
+# Keyed by hash so bearer tokens are never held in memory in plaintext.
+_token_cache: dict[bytes, tuple[float, dict]] = {}
+_token_cache_lock = threading.Lock()
+_TOKEN_CACHE_MAX = 10_000
+# Re-verify at least this often even if the token itself lives longer
+_TOKEN_CACHE_TTL = 50 * 60
+
+
+def _cached_claims(key: bytes) -> dict | None:
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry[0]:
+            del _token_cache[key]
+            return None
+        return entry[1]
+
+
+def _cache_claims(key: bytes, decoded: dict) -> None:
+    expires_at = min(float(decoded.get("exp", 0)), time.time() + _TOKEN_CACHE_TTL)
+    with _token_cache_lock:
+        if len(_token_cache) >= _TOKEN_CACHE_MAX:
+            now = time.time()
+            for k in [k for k, (exp, _) in _token_cache.items() if exp <= now]:
+                del _token_cache[k]
+            if len(_token_cache) >= _TOKEN_CACHE_MAX:
+                del _token_cache[next(iter(_token_cache))]
+        _token_cache[key] = (expires_at, decoded)
+
 
 async def get_current_user(request: Request) -> str:
     """FastAPI dependency that extracts and verifies Firebase Bearer token.
@@ -16,13 +51,16 @@ async def get_current_user(request: Request) -> str:
     Also performs an idempotent user upsert into the `users` table so that
     Supabase foreign keys (pdfs.user_id, subscriptions.user_id, etc.) always
     resolve without requiring a separate onboarding flow.
+
+    Verified tokens are cached until they expire, so repeat requests skip
+    both the signature check and the upsert.
     """
     token = None
 
     # Check Authorization header first
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split("Bearer ")[1]
+        token = auth_header[7:].strip()
 
     # Fallback to query param (for img/iframe src)
     if not token:
@@ -34,8 +72,16 @@ async def get_current_user(request: Request) -> str:
             detail="Missing or invalid Authorization header. Expected: Bearer <token>",
         )
 
+    cache_key = hashlib.sha256(token.encode()).digest()
+    decoded = _cached_claims(cache_key)
+    if decoded is not None:
+        # Already verified and upserted when this token was first seen
+        return decoded["uid"]
+
     try:
-        decoded = verify_id_token(token)
+        # firebase-admin is synchronous (crypto + occasional key refresh over
+        # HTTP); run it off the event loop so other requests keep flowing
+        decoded = await asyncio.to_thread(verify_id_token, token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
 
@@ -43,12 +89,15 @@ async def get_current_user(request: Request) -> str:
 
     # Idempotent user upsert — safe to call on every request
     try:
-        db.upsert_user(
+        await asyncio.to_thread(
+            db.upsert_user,
             uid,
             email=decoded.get("email", "") or "",
             display_name=decoded.get("name", "") or "",
         )
     except Exception as e:
         logger.warning(f"[auth] upsert_user failed for {uid}: {e}")
+    else:
+        _cache_claims(cache_key, decoded)
 
     return uid
@@ -2,7 +2,8 @@
 Supabase-backed persistence layer for Reade.
 
 Replaces the legacy file-based JSON + filesystem storage with:
-  - Postgres tables: users, subscriptions, pdfs, pdf_progress, pdf_analysis
+  - Postgres tables: users, subscriptions, pdfs, pdf_progress, pdf_analysis,
+    ai_results
   - Object storage buckets: pdfs, thumbnails, audio
 
 All functions use the service_role key (bypasses RLS) and explicitly
@@ -142,6 +143,7 @@ def save_pdf(user_id: str, pdf_id: str, info: dict) -> None:
         "cover_url": info.get("cover_url"),
         "description": info.get("description"),
         "tags": info.get("tags") or [],
+        "content_hash": info.get("content_hash"),
     }
     if info.get("uploaded_at"):
         payload["uploaded_at"] = info["uploaded_at"]
@@ -149,6 +151,13 @@ def save_pdf(user_id: str, pdf_id: str, info: dict) -> None:
     _client.table("pdfs").upsert(payload, on_conflict="id").execute()
 
 
+def set_has_thumbnail(user_id: str, pdf_id: str) -> None:
+    # Update rather than upsert so a PDF deleted meanwhile isn't recreated
+    _client.table("pdfs").update({"has_thumbnail": True}).eq("id", pdf_id).eq(
+        "user_id", user_id
+    ).execute()
+
+
 def get_pdf(user_id: str, pdf_id: str) -> Optional[dict]:
     res = (
         _client.table("pdfs")
@@ -172,6 +181,33 @@ def list_pdfs(user_id: str) -> list[dict]:
     return res.data or []
 
 
+# Columns /library renders, with each PDF's progress row embedded
+# (pdf_progress.pdf_id references pdfs.id) so the listing is one query
+_LIBRARY_COLUMNS = (
+    "id, filename, total_pages, has_thumbnail, uploaded_at, source, "
+    "original_title, original_author, cover_url, description, tags, "
+    "pdf_progress(current_page, total_time_seconds, completed, last_read_at, started_at)"
+)
+
+
+def list_library(user_id: str) -> list[dict]:
+    """PDF rows for the library view, newest first, each with `pdf_progress` (or None)."""
+    res = (
+        _client.table("pdfs")
+        .select(_LIBRARY_COLUMNS)
+        .eq("user_id", user_id)
+        .order("uploaded_at", desc=True)
+        .execute()
+    )
+    rows = res.data or []
+    for row in rows:
+        # One-to-one embeds come back as an object, or a list on older PostgREST
+        prog = row.get("pdf_progress")
+        if isinstance(prog, list):
+            row["pdf_progress"] = prog[0] if prog else None
+    return rows
+
+
 def delete_pdf(user_id: str, pdf_id: str) -> None:
     _client.table("pdfs").delete().eq("id", pdf_id).eq("user_id", user_id).execute()
 
@@ -223,16 +259,6 @@ def save_progress(user_id: str, pdf_id: str, progress: dict) -> None:
     _client.table("pdf_progress").upsert(payload, on_conflict="pdf_id").execute()
 
 
-def list_progress(user_id: str) -> list[dict]:
-    res = (
-        _client.table("pdf_progress")
-        .select("*")
-        .eq("user_id", user_id)
-        .execute()
-    )
-    return res.data or []
-
-
 # ------------------------------------------------------------------
 # AI analysis cache
 # ------------------------------------------------------------------
@@ -270,6 +296,26 @@ def delete_analysis(user_id: str, pdf_id: str) -> None:
     ).execute()
 
 
+# ------------------------------------------------------------------
+# AI results (content-addressed, shared across users)
+# ------------------------------------------------------------------
+
+def get_ai_result(cache_key: str) -> Optional[Any]:
+    res = (
+        _client.table("ai_results")
+        .select("result")
+        .eq("cache_key", cache_key)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0]["result"] if res.data else None
+
+
+def save_ai_result(cache_key: str, kind: str, result: Any) -> None:
+    payload = {"cache_key": cache_key, "kind": kind, "result": result}
+    _client.table("ai_results").upsert(payload, on_conflict="cache_key").execute()
+
+
 # ------------------------------------------------------------------
 # Object storage
 # ------------------------------------------------------------------
@@ -327,6 +373,10 @@ def pdf_object_path(user_id: str, pdf_id: str) -> str:
     return f"{user_id}/{pdf_id}.pdf"
 
 
+def pages_object_path(user_id: str, pdf_id: str) -> str:
+    return f"{user_id}/{pdf_id}.pages.json"
+
+
 def thumbnail_object_path(user_id: str, pdf_id: str) -> str:
     return f"{user_id}/{pdf_id}.png"
 
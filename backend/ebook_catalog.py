@@ -2,16 +2,45 @@
 Designed to feel like Spotify for book readers."""
 
 import re
+import time
 import httpx
+import orjson
 import asyncio
 import logging
+from collections import Counter
 from typing import Optional
 
 logger = logging.getLogger("catalog")
 
+# One pooled client for all Gutenberg / Open Library / Google Books calls, so
+# requests reuse keep-alive connections instead of a TLS handshake each time.
+_CLIENT: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            http2=True,
+        )
+    return _CLIENT
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client. Called on shutdown."""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+_GUT_RE = re.compile(r"gutenberg\.org/ebooks/(\d+)")
+
 
 def _gutenberg_cover(url: str) -> str | None:
-    m = re.search(r"gutenberg\.org/ebooks/(\d+)", url)
+    m = _GUT_RE.search(url)
     if m:
         return f"https://www.gutenberg.org/cache/epub/{m.group(1)}/pg{m.group(1)}.cover.medium.jpg"
     return None
@@ -33,6 +62,8 @@ def _gb(id: int, title: str, author: str, desc: str, tags: list[str]) -> dict:
 
 
 # ─── Curated catalog (120+ books) ─────────────────────────────────────────────
+# Every entry carries its cover_url at authoring time (_gb / _ol_cover), so
+# curated books never need _enrich.
 
 CATALOG = {
     "Trending": [
@@ -168,23 +199,27 @@ CATEGORIES = list(CATALOG.keys())
 _dynamic_books: dict[str, list[dict]] = {}
 _dynamic_loaded = False
 
+# Combined curated + dynamic catalog served by get_all_books(), with its search
+# index: (catalog, entries, index). Rebuilt only when the dynamic catalog changes
+# and published as one tuple so readers never pair an index with other entries.
+_catalog_snapshot: tuple[dict[str, list[dict]], list[tuple[str, dict, str]], dict[str, list[int]]] | None = None
+
 
 async def _fetch_gutenberg_popular(topic: str, limit: int = 15) -> list[dict]:
     """Fetch popular books from Gutendex API by topic."""
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            res = await client.get(
-                "https://gutendex.com/books/",
-                params={"topic": topic, "sort": "popular", "page_size": limit, "languages": "en"},
-            )
-            res.raise_for_status()
-            data = res.json()
+        res = await _get_client().get(
+            "https://gutendex.com/books/",
+            params={"topic": topic, "sort": "popular", "page_size": limit, "languages": "en"},
+            timeout=15,
+        )
+        res.raise_for_status()
+        data = orjson.loads(res.content)
 
         results = []
         for book in data.get("results", []):
             title = book.get("title", "")
-            authors = [a.get("name", "") for a in book.get("authors", [])]
-            author = ", ".join(authors[:2]) or "Unknown"
+            author = ", ".join(a.get("name", "") for a in (book.get("authors") or [])[:2]) or "Unknown"
             book_id = book.get("id", "")
             formats = book.get("formats", {})
             cover_url = formats.get("image/jpeg")
@@ -193,15 +228,15 @@ async def _fetch_gutenberg_popular(topic: str, limit: int = 15) -> list[dict]:
                 or formats.get("application/pdf")
                 or formats.get("text/plain; charset=utf-8")
             )
-            subjects = book.get("subjects", [])[:3]
-            tags = [s.lower().split(" -- ")[0].strip().replace(" ", "-") for s in subjects[:3]]
+            subjects = (book.get("subjects") or [])[:3]
+            tags = [s.lower().split(" -- ")[0].strip().replace(" ", "-") for s in subjects]
 
             results.append({
                 "title": title,
                 "author": author,
                 "url": f"https://www.gutenberg.org/ebooks/{book_id}",
                 "download_url": download_url,
-                "description": f"Topics: {', '.join(subjects[:3])}." if subjects else "Available on Project Gutenberg.",
+                "description": f"Topics: {', '.join(subjects)}." if subjects else "Available on Project Gutenberg.",
                 "cover_url": cover_url,
                 "tags": tags,
                 "source": "gutenberg",
@@ -215,13 +250,13 @@ async def _fetch_gutenberg_popular(topic: str, limit: int = 15) -> list[dict]:
 async def _fetch_open_library_trending(subject: str, limit: int = 15) -> list[dict]:
     """Fetch trending/popular books from Open Library by subject."""
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            res = await client.get(
-                f"https://openlibrary.org/subjects/{subject}.json",
-                params={"limit": limit, "details": "false"},
-            )
-            res.raise_for_status()
-            data = res.json()
+        res = await _get_client().get(
+            f"https://openlibrary.org/subjects/{subject}.json",
+            params={"limit": limit, "details": "false"},
+            timeout=15,
+        )
+        res.raise_for_status()
+        data = orjson.loads(res.content)
 
         results = []
         for work in data.get("works", []):
@@ -251,20 +286,20 @@ async def _fetch_open_library_trending(subject: str, limit: int = 15) -> list[di
 async def _fetch_google_books(query: str, category_label: str, limit: int = 20) -> list[dict]:
     """Fetch books from Google Books API (free, no key needed for small volume)."""
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            res = await client.get(
-                "https://www.googleapis.com/books/v1/volumes",
-                params={
-                    "q": query,
-                    "maxResults": min(limit, 40),
-                    "printType": "books",
-                    "filter": "free-ebooks",
-                    "orderBy": "relevance",
-                    "langRestrict": "en",
-                },
-            )
-            res.raise_for_status()
-            data = res.json()
+        res = await _get_client().get(
+            "https://www.googleapis.com/books/v1/volumes",
+            params={
+                "q": query,
+                "maxResults": min(limit, 40),
+                "printType": "books",
+                "filter": "free-ebooks",
+                "orderBy": "relevance",
+                "langRestrict": "en",
+            },
+            timeout=15,
+        )
+        res.raise_for_status()
+        data = orjson.loads(res.content)
 
         results = []
         for item in data.get("items", []):
@@ -307,7 +342,7 @@ async def _fetch_google_books(query: str, category_label: str, limit: int = 20)
 
 async def load_dynamic_catalog():
     """Fetch popular books from external APIs to enrich the catalog. Called on startup."""
-    global _dynamic_books, _dynamic_loaded
+    global _dynamic_books, _dynamic_loaded, _catalog_snapshot
 
     # Gutenberg popular by topic
     gutenberg_topics = {
@@ -358,7 +393,7 @@ async def load_dynamic_catalog():
 
     for key, result in zip(keys, results):
         if isinstance(result, list) and result:
-            _dynamic_books[key] = result
+            _dynamic_books[key] = [_enrich(b) for b in result]
             logger.info(f"Loaded {len(result)} books for '{key}'")
 
     # Run Google Books sequentially with delays to avoid 429 rate limits
@@ -366,13 +401,14 @@ async def load_dynamic_catalog():
         try:
             result = await _fetch_google_books(query, label, 20)
             if result:
-                _dynamic_books[label] = result
+                _dynamic_books[label] = [_enrich(b) for b in result]
                 logger.info(f"Loaded {len(result)} books for '{label}'")
             await asyncio.sleep(3)  # Rate limit delay for Google Books
         except Exception as e:
             logger.warning(f"Google Books fetch failed for {label}: {e}")
 
     _dynamic_loaded = True
+    _catalog_snapshot = None
     total = sum(len(v) for v in _dynamic_books.values())
     logger.info(f"Dynamic catalog loaded: {total} books across {len(_dynamic_books)} categories")
 
@@ -380,28 +416,60 @@ async def load_dynamic_catalog():
 # ─── Public API ────────────────────────────────────────────────────────────────
 
 def _enrich(book: dict) -> dict:
-    """Add cover_url if missing."""
-    if "cover_url" not in book or book.get("cover_url") is None:
-        cover = _gutenberg_cover(book.get("url", ""))
-        return {**book, "cover_url": cover}
+    """Add cover_url to a fetched book if missing. Mutates and returns `book`."""
+    if book.get("cover_url") is None:
+        book["cover_url"] = _gutenberg_cover(book.get("url", ""))
     return book
 
 
 def get_all_books() -> dict:
-    """Return combined curated + dynamic catalog."""
-    combined = {cat: [_enrich(b) for b in books] for cat, books in CATALOG.items()}
-    # Merge dynamic books (don't duplicate categories)
+    """Return combined curated + dynamic catalog. Shared — treat as read-only."""
+    return _get_catalog_snapshot()[0]
+
+
+def _get_catalog_snapshot() -> tuple[dict[str, list[dict]], list[tuple[str, dict, str]], dict[str, list[int]]]:
+    global _catalog_snapshot
+    snapshot = _catalog_snapshot
+    if snapshot is not None:
+        return snapshot
+    combined = {cat: list(books) for cat, books in CATALOG.items()}
+    # Merge dynamic books (already enriched on load; don't duplicate categories)
     for cat, books in _dynamic_books.items():
         if cat not in combined:
-            combined[cat] = [_enrich(b) for b in books]
+            combined[cat] = list(books)
         else:
             # Dedupe by title
             existing_titles = {b["title"].lower() for b in combined[cat]}
             for b in books:
                 if b["title"].lower() not in existing_titles:
-                    combined[cat].append(_enrich(b))
+                    combined[cat].append(b)
                     existing_titles.add(b["title"].lower())
-    return combined
+    snapshot = (combined, *_build_search_index(combined))
+    _catalog_snapshot = snapshot
+    return snapshot
+
+
+_SEARCH_WORD_RE = re.compile(r"[a-z0-9]+")
+_SEARCH_STOP_WORDS = frozenset(
+    {"the", "a", "an", "of", "in", "on", "by", "to", "and", "or", "is", "it", "for", "with", "from"}
+)
+
+
+def _build_search_index(
+    combined: dict[str, list[dict]],
+) -> tuple[list[tuple[str, dict, str]], dict[str, list[int]]]:
+    """Returns (entries, index): (category, book, lowercase title) in catalog
+    order, and an inverted index of word -> positions in entries."""
+    entries = []
+    index: dict[str, list[int]] = {}
+    for category, books in combined.items():
+        for book in books:
+            pos = len(entries)
+            entries.append((category, book, book["title"].lower()))
+            searchable = f"{book['title']} {book['author']} {book.get('description', '')}".lower()
+            for w in set(_SEARCH_WORD_RE.findall(searchable)):
+                index.setdefault(w, []).append(pos)
+    return entries, index
 
 
 def get_books_by_category(category: str) -> list[dict]:
@@ -411,55 +479,87 @@ def get_books_by_category(category: str) -> list[dict]:
 
 def search_books_local(query: str) -> list[dict]:
     """Search all catalogs by individual words."""
-    stop_words = {"the", "a", "an", "of", "in", "on", "by", "to", "and", "or", "is", "it", "for", "with", "from"}
-    words = [w for w in query.lower().split() if len(w) > 1 and w not in stop_words]
+    words = [w for w in _SEARCH_WORD_RE.findall(query.lower()) if len(w) > 1 and w not in _SEARCH_STOP_WORDS]
     if not words:
         return []
-    results = []
-    for category, books in get_all_books().items():
-        for book in books:
-            searchable = f"{book['title']} {book['author']} {book.get('description', '')}".lower()
-            matches = sum(1 for w in words if w in searchable)
-            if matches > 0:
-                results.append({**_enrich(book), "category": category, "source": book.get("source", "curated"), "_score": matches})
-    # Dedupe by title
+    _, entries, index = _get_catalog_snapshot()  # builds the index on first use / after a reload
+    scores: Counter[int] = Counter()
+    for w in words:
+        scores.update(index.get(w, ()))
+    # Best score first; ties keep catalog order. Dedupe by title before
+    # building any result dicts.
     seen = set()
-    deduped = []
-    for r in sorted(results, key=lambda x: x["_score"], reverse=True):
-        key = r["title"].lower()
-        if key not in seen:
-            seen.add(key)
-            deduped.append(r)
-    for r in deduped:
-        del r["_score"]
-    return deduped
+    results = []
+    for pos in sorted(scores, key=lambda p: (-scores[p], p)):
+        category, book, title_key = entries[pos]
+        if title_key not in seen:
+            seen.add(title_key)
+            results.append({**book, "category": category, "source": book.get("source", "curated")})
+    return results
+
+
+# ─── External search ──────────────────────────────────────────────────────────
+# Results are cached per (source, query, limit) for a few minutes, and
+# concurrent identical searches share one upstream request.
+
+SEARCH_CACHE_TTL = 600
+_SEARCH_CACHE_MAX = 512
+_search_cache: dict[tuple, tuple[float, list[dict]]] = {}
+_search_inflight: dict[tuple, asyncio.Task] = {}
+
+
+async def _cached_search(source: str, query: str, limit: int, fetch) -> list[dict]:
+    key = (source, query.lower().strip(), limit)
+    entry = _search_cache.get(key)
+    if entry is not None and time.time() < entry[0]:
+        return entry[1]
+    task = _search_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch(query, limit))
+        _search_inflight[key] = task
+        task.add_done_callback(lambda _: _search_inflight.pop(key, None))
+    # Shielded so one caller disconnecting doesn't cancel the others' request
+    results = await asyncio.shield(task)
+    if results:  # failures come back empty; don't pin them in the cache
+        if key not in _search_cache and len(_search_cache) >= _SEARCH_CACHE_MAX:
+            _search_cache.pop(next(iter(_search_cache)))
+        _search_cache[key] = (time.time() + SEARCH_CACHE_TTL, results)
+    return results
 
 
 async def search_open_library(query: str, limit: int = 20) -> list[dict]:
     """Search Open Library for free ebooks."""
+    return await _cached_search("openlibrary", query, limit, _search_open_library)
+
+
+async def search_gutenberg(query: str, limit: int = 10) -> list[dict]:
+    """Search Project Gutenberg for free public domain ebooks."""
+    return await _cached_search("gutenberg", query, limit, _search_gutenberg)
+
+
+async def _search_open_library(query: str, limit: int) -> list[dict]:
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            res = await client.get(
-                "https://openlibrary.org/search.json",
-                params={"q": query, "limit": limit, "has_fulltext": "true"},
-            )
-            res.raise_for_status()
-            data = res.json()
+        res = await _get_client().get(
+            "https://openlibrary.org/search.json",
+            params={"q": query, "limit": limit, "has_fulltext": "true"},
+        )
+        res.raise_for_status()
+        data = orjson.loads(res.content)
 
         results = []
         for doc in data.get("docs", []):
             title = doc.get("title", "")
-            author = ", ".join(doc.get("author_name", [])[:2]) or "Unknown"
+            author = ", ".join((doc.get("author_name") or [])[:2]) or "Unknown"
             key = doc.get("key", "")
             cover_id = doc.get("cover_i")
             ia_ids = doc.get("ia", [])
             download_url = f"https://archive.org/download/{ia_ids[0]}/{ia_ids[0]}.pdf" if ia_ids else None
-            subjects = doc.get("subject", [])[:3]
+            subjects = (doc.get("subject") or [])[:3]
             year = doc.get("first_publish_year", "")
             desc = f"Published {year}. " if year else ""
             if subjects:
-                desc += f"Topics: {', '.join(subjects[:3])}."
-            tags = [s.lower().replace(" ", "-") for s in subjects[:3]] if subjects else []
+                desc += f"Topics: {', '.join(subjects)}."
+            tags = [s.lower().replace(" ", "-") for s in subjects]
 
             results.append({
                 "title": title, "author": author,
@@ -476,22 +576,19 @@ async def search_open_library(query: str, limit: int = 20) -> list[dict]:
         return []
 
 
-async def search_gutenberg(query: str, limit: int = 10) -> list[dict]:
-    """Search Project Gutenberg for free public domain ebooks."""
+async def _search_gutenberg(query: str, limit: int) -> list[dict]:
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            res = await client.get(
-                "https://gutendex.com/books/",
-                params={"search": query, "page_size": limit},
-            )
-            res.raise_for_status()
-            data = res.json()
+        res = await _get_client().get(
+            "https://gutendex.com/books/",
+            params={"search": query, "page_size": limit},
+        )
+        res.raise_for_status()
+        data = orjson.loads(res.content)
 
         results = []
         for book in data.get("results", []):
             title = book.get("title", "")
-            authors = [a.get("name", "") for a in book.get("authors", [])]
-            author = ", ".join(authors[:2]) or "Unknown"
+            author = ", ".join(a.get("name", "") for a in (book.get("authors") or [])[:2]) or "Unknown"
             book_id = book.get("id", "")
             formats = book.get("formats", {})
             download_url = (
@@ -500,14 +597,14 @@ async def search_gutenberg(query: str, limit: int = 10) -> list[dict]:
                 or formats.get("text/plain; charset=utf-8")
             )
             cover_url = formats.get("image/jpeg")
-            subjects = book.get("subjects", [])[:3]
-            tags = [s.lower().replace(" ", "-") for s in subjects[:3]] if subjects else []
+            subjects = (book.get("subjects") or [])[:3]
+            tags = [s.lower().replace(" ", "-") for s in subjects]
 
             results.append({
                 "title": title, "author": author,
                 "url": f"https://www.gutenberg.org/ebooks/{book_id}" if book_id else "",
                 "download_url": download_url,
-                "description": f"Topics: {', '.join(subjects[:3])}." if subjects else "Available on Project Gutenberg.",
+                "description": f"Topics: {', '.join(subjects)}." if subjects else "Available on Project Gutenberg.",
                 "cover_url": cover_url,
                 "category": "Project Gutenberg", "source": "gutenberg",
                 "tags": tags,
@@ -515,3 +612,13 @@ async def search_gutenberg(query: str, limit: int = 10) -> list[dict]:
         return results
     except Exception:
         return []
+
+
+async def search_external(query: str, ol_limit: int = 20, gut_limit: int = 15) -> list[dict]:
+    """Search Gutenberg and Open Library concurrently; Gutenberg results first."""
+    results = await asyncio.gather(
+        search_gutenberg(query, limit=gut_limit),
+        search_open_library(query, limit=ol_limit),
+        return_exceptions=True,
+    )
+    return [book for r in results if isinstance(r, list) for book in r]
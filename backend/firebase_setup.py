@@ -35,6 +35,8 @@ def init_firebase():
 
 
 def verify_id_token(id_token: str) -> dict:
-    """Verify a Firebase ID token and return the decoded token."""
-    init_firebase()
+    """Verify a Firebase ID token and return the decoded token.
+
+    Firebase is initialized once at app startup (see main.startup).
+    """
     return auth.verify_id_token(id_token)
@@ -1,15 +1,23 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uuid
 import json
+import hashlib
 import os
 import re
+import time
 import asyncio
+import threading
 import traceback
+import anyio
 import httpx
+import msgspec
+import orjson
 import stripe
+from collections import OrderedDict
+from itertools import accumulate
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -26,9 +34,12 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 FREE_MAX_BOOKS = 5
 FREE_MAX_STORAGE_MB = 100
 
-from pdf_parser import extract_pages, get_metadata, find_relevant_chunks, extract_outline, detect_chapters_from_text
-from ai_engine import ask_question, summarize_document, recommend_books, clean_text_for_tts, analyze_document
-from ebook_catalog import get_all_books, get_books_by_category, search_books_local, search_open_library, search_gutenberg, CATEGORIES, load_dynamic_catalog
+from pdf_parser import extract_pages, parse_pdf_once, render_thumbnail, build_search_index, find_relevant_chunks, detect_chapters
+from ai_engine import (
+    ask_question, ask_question_stream, summarize_document, recommend_books, clean_text_for_tts, analyze_document,
+    analyze_document_async, analysis_result_key, stored_analysis, PROMPT_VERSION,
+)
+from ebook_catalog import get_all_books, get_books_by_category, search_books_local, search_external, CATEGORIES, load_dynamic_catalog, close_http_client
 from firebase_setup import init_firebase
 from auth_middleware import get_current_user
 import db
@@ -38,7 +49,8 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api")
 
-app = FastAPI(title="PDF Intelligence API")
+# Library, analysis and catalog payloads are large; serialize them with orjson
+app = FastAPI(title="PDF Intelligence API", default_response_class=ORJSONResponse)
 
 
 @app.exception_handler(Exception)
@@ -60,8 +72,15 @@ app.add_middleware(
 )
 
 
+# Sync endpoints (PDF parsing, storage, Claude calls) run in AnyIO's worker
+# threads; the default of 40 caps concurrent requests well below what the
+# mostly I/O-bound work can sustain.
+WORKER_THREADS = 200
+
+
 @app.on_event("startup")
 async def startup():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
     try:
         init_firebase()
         print("[Startup] Firebase initialized (auth only)")
@@ -69,6 +88,18 @@ async def startup():
         print(f"[Startup] Firebase init failed: {e}")
     # Load dynamic book catalog in background (non-blocking)
     asyncio.ensure_future(load_dynamic_catalog())
+    global _progress_flusher
+    _progress_flusher = asyncio.create_task(_flush_progress_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    _progress_stop.set()
+    if _progress_flusher is not None:
+        await _progress_flusher  # finishes the round in flight, then a final flush
+    else:
+        await _flush_progress()
+    await close_http_client()
 
 
 # --- Subscription / quota helpers ---
@@ -103,9 +134,34 @@ def _check_upload_quota(user_id: str, new_file_size: int):
         )
 
 
+# Recently fetched PDF rows. Nearly every endpoint starts with _require_pdf, and
+# the reader saves progress every few seconds, so this saves a Supabase round
+# trip per request. Writes in this process call _forget_pdf.
+PDF_ROW_CACHE_TTL = 60
+_PDF_ROW_CACHE_MAX = 1024
+_pdf_rows: dict[str, tuple[float, dict]] = {}
+_pdf_rows_lock = threading.Lock()
+
+
+def _forget_pdf(user_id: str, pdf_id: str) -> None:
+    with _pdf_rows_lock:
+        _pdf_rows.pop(f"{user_id}/{pdf_id}", None)
+
+
 def _require_pdf(user_id: str, pdf_id: str) -> dict:
     """Return the PDF row or raise 404. Replaces legacy get_pdf_meta."""
+    cache_key = f"{user_id}/{pdf_id}"
+    now = time.time()
+    with _pdf_rows_lock:
+        entry = _pdf_rows.get(cache_key)
+    if entry is not None and now < entry[0]:
+        return entry[1]
     row = db.get_pdf(user_id, pdf_id)
+    if row:
+        with _pdf_rows_lock:
+            if cache_key not in _pdf_rows and len(_pdf_rows) >= _PDF_ROW_CACHE_MAX:
+                _pdf_rows.pop(next(iter(_pdf_rows)))
+            _pdf_rows[cache_key] = (now + PDF_ROW_CACHE_TTL, row)
     if not row:
         # Debug: check if PDF exists for ANY user
         all_pdfs = db.list_pdfs(user_id)
@@ -119,15 +175,154 @@ def _download_pdf_bytes(user_id: str, pdf_id: str) -> bytes:
     return db.download_file(db.BUCKET_PDFS, db.pdf_object_path(user_id, pdf_id))
 
 
+# Identical PDF bytes (another user's copy, a re-upload) reuse an earlier
+# analysis. The shared entry doesn't duplicate it: it points at the persisted
+# analyze_document result and records the chapters layered on top of it.
+def _shared_analysis_key(content_hash: str) -> str:
+    return f"pdf-analysis:{PROMPT_VERSION}:{content_hash}"
+
+
+def _shared_analysis(content_hash: str | None) -> dict | None:
+    """Analysis already produced for identical PDF bytes, by any user."""
+    if not content_hash:
+        return None
+    try:
+        ref = db.get_ai_result(_shared_analysis_key(content_hash))
+    except Exception as e:
+        logger.warning(f"[Analysis] Shared analysis lookup failed: {e}")
+        return None
+    if not ref:
+        return None
+    analysis = stored_analysis(ref["result_key"])
+    if analysis is None:
+        return None
+    analysis["chapters"] = ref["chapters"]
+    analysis["chapter_source"] = ref["chapter_source"]
+    return analysis
+
+
+def _store_analysis(
+    user_id: str, pdf_id: str, content_hash: str | None, analysis: dict, result_key: str | None = None
+) -> None:
+    db.save_analysis(user_id, pdf_id, analysis, chapter_source=analysis.get("chapter_source"))
+    if content_hash and result_key:
+        ref = {
+            "result_key": result_key,
+            "chapters": analysis.get("chapters", []),
+            "chapter_source": analysis.get("chapter_source"),
+        }
+        try:
+            db.save_ai_result(_shared_analysis_key(content_hash), "pdf_analysis", ref)
+        except Exception as e:
+            logger.warning(f"[Analysis] Saving shared analysis failed: {e}")
+
+
+def _save_pages(user_id: str, pdf_id: str, pages: list[dict]) -> None:
+    """Persist extracted page text next to the PDF so it is never re-parsed."""
+    try:
+        db.upload_file(
+            db.BUCKET_PDFS,
+            db.pages_object_path(user_id, pdf_id),
+            orjson.dumps(pages),
+            content_type="application/json",
+        )
+    except Exception as e:
+        logger.warning(f"[Pages] Saving extracted pages failed for {pdf_id}: {e}")
+
+
+def _load_pages(user_id: str, pdf_id: str) -> list[dict]:
+    """Extracted page text from storage; re-extracts (and saves) if it's missing."""
+    try:
+        return orjson.loads(db.download_file(db.BUCKET_PDFS, db.pages_object_path(user_id, pdf_id)))
+    except Exception:
+        pass  # Uploaded before pages were persisted, or imported from explore
+    pages = extract_pages(_download_pdf_bytes(user_id, pdf_id))
+    _save_pages(user_id, pdf_id, pages)
+    return pages
+
+
+# In-memory LRU of extracted PDF pages (avoids a storage round-trip per request).
+# Sync endpoints hit it from worker threads, hence the lock.
+PAGES_CACHE_MAX = 64
+PAGES_CACHE_TTL = 600
+_pages_cache: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+_pages_cache_lock = threading.Lock()
+
+def _get_pages_cached(user_id: str, pdf_id: str) -> list[dict]:
+    cache_key = f"{user_id}/{pdf_id}"
+    now = time.time()
+    with _pages_cache_lock:
+        entry = _pages_cache.get(cache_key)
+        if entry is not None and now - entry[0] < PAGES_CACHE_TTL:
+            _pages_cache.move_to_end(cache_key)
+            return entry[1]
+    pages = _load_pages(user_id, pdf_id)
+    with _pages_cache_lock:
+        _pages_cache[cache_key] = (now, pages)
+        _pages_cache.move_to_end(cache_key)
+        while len(_pages_cache) > PAGES_CACHE_MAX:
+            evicted, _ = _pages_cache.popitem(last=False)
+            _drop_search_index(evicted)
+    return pages
+
+
+# TF-IDF search index per cached document, evicted together with its pages.
+# An index takes roughly 14x its page text in memory, so besides following the
+# pages LRU the indexes are bounded by their total page count (LRU order).
+SEARCH_INDEX_MAX_PAGES = 3000
+_search_indexes: OrderedDict[str, tuple[int, dict]] = OrderedDict()  # key -> (page count, index)
+_search_index_pages = 0
+
+
+def _drop_search_index(cache_key: str) -> None:
+    """Forget a document's index. Caller holds _pages_cache_lock."""
+    global _search_index_pages
+    entry = _search_indexes.pop(cache_key, None)
+    if entry is not None:
+        _search_index_pages -= entry[0]
+
+
+def _get_search_index(user_id: str, pdf_id: str) -> dict:
+    global _search_index_pages
+    cache_key = f"{user_id}/{pdf_id}"
+    pages = _get_pages_cached(user_id, pdf_id)
+    with _pages_cache_lock:
+        entry = _search_indexes.get(cache_key)
+        if entry is not None:
+            _search_indexes.move_to_end(cache_key)
+            return entry[1]
+    index = build_search_index(pages)
+    with _pages_cache_lock:
+        if cache_key in _pages_cache and len(pages) <= SEARCH_INDEX_MAX_PAGES:
+            _drop_search_index(cache_key)
+            _search_indexes[cache_key] = (len(pages), index)
+            _search_index_pages += len(pages)
+            while _search_index_pages > SEARCH_INDEX_MAX_PAGES:
+                _drop_search_index(next(iter(_search_indexes)))
+    return index
+
+
 # --- Request models ---
+# Hot-path bodies are msgspec Structs decoded straight from the raw JSON by
+# _json_body, skipping Pydantic validation; ImportBookRequest stays Pydantic.
 
-class ProgressRequest(BaseModel):
+def _json_body(model: type[msgspec.Struct]):
+    """Dependency that decodes the JSON request body into `model`."""
+    async def decode(request: Request):
+        try:
+            return msgspec.json.decode(await request.body(), type=model, strict=False)
+        except msgspec.DecodeError as e:  # includes ValidationError
+            raise HTTPException(status_code=422, detail=str(e))
+    return decode
+
+
+class ProgressRequest(msgspec.Struct):
     current_page: int = 1
     reading_time_seconds: int = 0
     completed: bool = False
 
 
-class AskRequest(BaseModel):
+class AskRequest(msgspec.Struct):
     pdf_id: str
     question: str
     voice_mode: bool = False
@@ -135,14 +330,14 @@ class AskRequest(BaseModel):
     page_end: int | None = None
 
 
-class SummarizeRequest(BaseModel):
+class SummarizeRequest(msgspec.Struct):
     pdf_id: str
     voice_mode: bool = False
     page_start: int | None = None
     page_end: int | None = None
 
 
-class TTSRequest(BaseModel):
+class TTSRequest(msgspec.Struct):
     pdf_id: str
     start_page: int = 1
     num_pages: int = 5
@@ -155,9 +350,12 @@ class TTSRequest(BaseModel):
 def get_page_range(pages: list[dict], start: int | None, end: int | None) -> list[dict]:
     if start is None and end is None:
         return pages
-    s = start or 1
-    e = end or len(pages)
-    return [p for p in pages if s <= p["page"] <= e]
+    # Pages are numbered 1..N in order, so the range is a slice
+    s = max(start or 1, 1)
+    e = min(end or len(pages), len(pages))
+    if e < s:
+        return []
+    return pages[s - 1:e]
 
 
 # --- Endpoints ---
@@ -185,50 +383,82 @@ def health():
 
 # --- Library management (auth required) ---
 
-async def _run_analysis_background(user_id: str, pdf_id: str, pdf_bytes: bytes):
+async def _run_analysis_background(
+    user_id: str, pdf_id: str, pdf_bytes: bytes, pages: list[dict], content_hash: str
+):
     """Run document analysis in background after upload."""
     try:
-        pages = extract_pages(pdf_bytes)
-        chapters = extract_outline(pdf_bytes)
-        chapter_source = "bookmarks"
-        if not chapters:
-            chapters = detect_chapters_from_text(pages)
-            chapter_source = "heuristics"
-        if not chapters:
-            chapter_source = "ai"
-
-        loop = asyncio.get_event_loop()
-        analysis = await loop.run_in_executor(
-            None, lambda: analyze_document(pages, known_chapters=chapters if chapters else None)
-        )
+        shared = await asyncio.to_thread(_shared_analysis, content_hash)
+        if shared is not None:
+            await asyncio.to_thread(_store_analysis, user_id, pdf_id, None, shared)
+            logger.info(f"[Analysis] Reused analysis of identical content for {pdf_id}")
+            return
+
+        chapters, chapter_source = await asyncio.to_thread(detect_chapters, pdf_bytes, pages)
+
+        known_chapters = chapters if chapters else None
+
+        analysis = await analyze_document_async(pages, known_chapters=known_chapters)
 
         if chapters and chapter_source != "ai":
             analysis["chapters"] = [{"title": c["title"], "page": c["page"]} for c in chapters]
         analysis["chapter_source"] = chapter_source
 
-        db.save_analysis(user_id, pdf_id, analysis, chapter_source=chapter_source)
+        await asyncio.to_thread(
+            _store_analysis, user_id, pdf_id, content_hash, analysis, analysis_result_key(pages, known_chapters)
+        )
         logger.info(f"[Analysis] Background analysis complete for {pdf_id}")
     except Exception as e:
         logger.error(f"[Analysis] Background analysis failed for {pdf_id}: {e}")
 
 
+# Uploads whose thumbnail is still rendering; /pdf/{id}/thumbnail answers 202
+_thumbnails_pending: set[str] = set()
+
+
+def _generate_thumbnail(user_id: str, pdf_id: str, pdf_bytes: bytes):
+    """Render and store the first-page thumbnail after the upload has returned."""
+    try:
+        db.upload_file(
+            db.BUCKET_THUMBNAILS,
+            db.thumbnail_object_path(user_id, pdf_id),
+            render_thumbnail(pdf_bytes),
+            content_type="image/png",
+        )
+        db.set_has_thumbnail(user_id, pdf_id)
+        _forget_pdf(user_id, pdf_id)
+    except Exception as e:
+        logger.warning(f"[Upload] Thumbnail generation failed for {pdf_id}: {e}")
+    finally:
+        _thumbnails_pending.discard(pdf_id)
+
+
 @app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...), user_id: str = Depends(get_current_user)):
+def upload_pdf(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user),
+):
     logger.info(f"[Upload] user={user_id}, file={file.filename}")
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
 
-    pdf_bytes = await file.read()
-    file_size = len(pdf_bytes)
+    # The upload is already spooled to a temp file; size it there so oversized
+    # or over-quota files are rejected before being read into memory
+    file.file.seek(0, os.SEEK_END)
+    file_size = file.file.tell()
     if file_size > 50 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large. Max 50MB.")
 
     # Check free tier quota
     _check_upload_quota(user_id, file_size)
 
+    file.file.seek(0)
+    pdf_bytes = file.file.read()
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+
     try:
-        pages = extract_pages(pdf_bytes)
-        metadata = get_metadata(pdf_bytes)
+        pages, metadata = parse_pdf_once(pdf_bytes)
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to parse PDF: {e}")
 
@@ -246,57 +476,40 @@ async def upload_pdf(file: UploadFile = File(...), user_id: str = Depends(get_cu
         logger.error(f"[Upload] Storage upload failed: {e}")
         raise HTTPException(status_code=502, detail="Failed to save PDF to storage.")
 
-    # Generate and upload thumbnail using PyMuPDF
-    has_thumbnail = False
-    try:
-        import fitz
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[0]
-        pix = page.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))
-        thumb_bytes = pix.tobytes("png")
-        doc.close()
-        db.upload_file(
-            db.BUCKET_THUMBNAILS,
-            db.thumbnail_object_path(user_id, pdf_id),
-            thumb_bytes,
-            content_type="image/png",
-        )
-        has_thumbnail = True
-    except Exception as e:
-        logger.warning(f"[Upload] Thumbnail generation failed: {e}")
+    _save_pages(user_id, pdf_id, pages)
 
-    # Save metadata row
+    # Save metadata row; has_thumbnail flips once the background render lands
     db.save_pdf(user_id, pdf_id, {
         "filename": file.filename,
         "total_pages": metadata["total_pages"],
         "file_size_bytes": file_size,
-        "has_thumbnail": has_thumbnail,
+        "has_thumbnail": False,
         "source": "upload",
+        "content_hash": content_hash,
         "uploaded_at": datetime.utcnow().isoformat(),
     })
 
     logger.info(f"[Upload] Success: pdf_id={pdf_id}")
 
-    # Trigger background analysis so it's ready when user clicks the book
-    asyncio.ensure_future(_run_analysis_background(user_id, pdf_id, pdf_bytes))
+    # Thumbnail first (quick), then analysis so it's ready when user clicks the book
+    _thumbnails_pending.add(pdf_id)
+    background_tasks.add_task(_generate_thumbnail, user_id, pdf_id, pdf_bytes)
+    background_tasks.add_task(_run_analysis_background, user_id, pdf_id, pdf_bytes, pages, content_hash)
 
     return {
         "pdf_id": pdf_id,
         "filename": file.filename,
         "total_pages": metadata["total_pages"],
-        "thumbnail_url": f"/pdf/{pdf_id}/thumbnail" if has_thumbnail else None,
+        "thumbnail_url": f"/pdf/{pdf_id}/thumbnail",
         "message": "PDF uploaded and added to library.",
     }
 
 
 @app.get("/library")
 def list_pdfs(user_id: str = Depends(get_current_user)):
-    pdfs = db.list_pdfs(user_id)
-    # Fetch progress and analysis in bulk to avoid N+1
-    progress_by_pdf = {p["pdf_id"]: p for p in db.list_progress(user_id)}
-
+    # PDFs and their progress in one query (progress is embedded per row)
     result = []
-    for item in pdfs:
+    for item in db.list_library(user_id):
         pdf_id = item["id"]
         entry = {
             "pdf_id": pdf_id,
@@ -305,15 +518,10 @@ def list_pdfs(user_id: str = Depends(get_current_user)):
             "thumbnail_url": f"/pdf/{pdf_id}/thumbnail" if item.get("has_thumbnail") else None,
             "uploaded_at": item.get("uploaded_at"),
         }
-        prog = progress_by_pdf.get(pdf_id)
+        prog = _pending_progress(user_id, pdf_id) or item.get("pdf_progress")
         if prog:
-            entry["progress"] = {
-                "current_page": prog.get("current_page", 1),
-                "total_time_seconds": prog.get("total_time_seconds", 0),
-                "completed": prog.get("completed", False),
-                "last_read_at": prog.get("last_read_at"),
-                "started_at": prog.get("started_at"),
-            }
+            # Already limited to the progress fields the client reads
+            entry["progress"] = prog
         # Pass through optional explore-import fields
         if item.get("source") == "explore_import":
             entry["source"] = "explore_import"
@@ -333,11 +541,18 @@ def delete_pdf(pdf_id: str, user_id: str = Depends(get_current_user)):
 
     # Delete from object storage (best-effort)
     db.delete_file(db.BUCKET_PDFS, db.pdf_object_path(user_id, pdf_id))
+    db.delete_file(db.BUCKET_PDFS, db.pages_object_path(user_id, pdf_id))
     if info.get("has_thumbnail"):
         db.delete_file(db.BUCKET_THUMBNAILS, db.thumbnail_object_path(user_id, pdf_id))
+    with _pages_cache_lock:
+        _pages_cache.pop(f"{user_id}/{pdf_id}", None)
+        _drop_search_index(f"{user_id}/{pdf_id}")
+    with _progress_lock:
+        _progress_pending.pop((user_id, pdf_id), None)
 
     # Delete the pdf row — cascades to pdf_progress and pdf_analysis
     db.delete_pdf(user_id, pdf_id)
+    _forget_pdf(user_id, pdf_id)
     return {"message": f"Deleted '{filename}' from library."}
 
 
@@ -361,18 +576,15 @@ def get_pdf_thumbnail(pdf_id: str, user_id: str = Depends(get_current_user)):
 
     # Generate on-demand if missing
     if not info.get("has_thumbnail"):
+        if pdf_id in _thumbnails_pending:
+            return Response(status_code=202, headers={"Retry-After": "1"})
         try:
-            import fitz
-            pdf_bytes = _download_pdf_bytes(user_id, pdf_id)
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            page = doc[0]
-            pix = page.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))
-            thumb_bytes = pix.tobytes("png")
-            doc.close()
+            thumb_bytes = render_thumbnail(_download_pdf_bytes(user_id, pdf_id))
             db.upload_file(
                 db.BUCKET_THUMBNAILS, thumb_path, thumb_bytes, content_type="image/png"
             )
-            db.save_pdf(user_id, pdf_id, {**info, "has_thumbnail": True})
+            db.set_has_thumbnail(user_id, pdf_id)
+            _forget_pdf(user_id, pdf_id)
         except Exception:
             raise HTTPException(status_code=404, detail="Thumbnail not found.")
 
@@ -387,10 +599,57 @@ def get_pdf_thumbnail(pdf_id: str, user_id: str = Depends(get_current_user)):
 
 # --- Reading progress (auth required) ---
 
+# Progress ticks arrive every few seconds per reader and each one used to be a
+# Supabase upsert. Updates are write-combined here and flushed in the background;
+# reads check the pending entry first so clients always see their latest tick.
+PROGRESS_FLUSH_INTERVAL = 5
+_progress_pending: dict[tuple[str, str], dict] = {}
+_progress_lock = threading.Lock()
+_progress_flusher: asyncio.Task | None = None
+_progress_stop = asyncio.Event()
+
+
+def _pending_progress(user_id: str, pdf_id: str) -> dict | None:
+    with _progress_lock:
+        return _progress_pending.get((user_id, pdf_id))
+
+
+async def _flush_progress() -> None:
+    # Entries stay pending until their upsert succeeds, so a tick arriving
+    # mid-flush still accumulates onto the latest progress, not the stored row
+    with _progress_lock:
+        batch = list(_progress_pending.items())
+    for key, progress in batch:
+        user_id, pdf_id = key
+        try:
+            await asyncio.to_thread(db.save_progress, user_id, pdf_id, progress)
+        except Exception as e:
+            logger.warning(f"[Progress] Flush failed for {pdf_id}: {e}")
+            continue  # Retried next round
+        with _progress_lock:
+            # Keep it if a newer tick replaced it while the upsert ran
+            if _progress_pending.get(key) is progress:
+                del _progress_pending[key]
+
+
+async def _flush_progress_loop() -> None:
+    while not _progress_stop.is_set():
+        try:
+            await asyncio.wait_for(_progress_stop.wait(), PROGRESS_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await _flush_progress()
+    await _flush_progress()
+
+
 @app.post("/library/{pdf_id}/progress")
-def save_progress(pdf_id: str, req: ProgressRequest, user_id: str = Depends(get_current_user)):
+def save_progress(
+    pdf_id: str,
+    user_id: str = Depends(get_current_user),
+    req: ProgressRequest = Depends(_json_body(ProgressRequest)),
+):
     _require_pdf(user_id, pdf_id)
-    existing = db.get_progress(user_id, pdf_id) or {}
+    existing = _pending_progress(user_id, pdf_id) or db.get_progress(user_id, pdf_id) or {}
     now = datetime.utcnow().isoformat()
     progress = {
         "current_page": req.current_page,
@@ -399,14 +658,15 @@ def save_progress(pdf_id: str, req: ProgressRequest, user_id: str = Depends(get_
         "last_read_at": now,
         "started_at": existing.get("started_at") or now,
     }
-    db.save_progress(user_id, pdf_id, progress)
+    with _progress_lock:
+        _progress_pending[(user_id, pdf_id)] = progress
     return {"progress": progress}
 
 
 @app.get("/library/{pdf_id}/progress")
 def get_progress(pdf_id: str, user_id: str = Depends(get_current_user)):
     _require_pdf(user_id, pdf_id)
-    prog = db.get_progress(user_id, pdf_id) or {}
+    prog = _pending_progress(user_id, pdf_id) or db.get_progress(user_id, pdf_id) or {}
     return {
         "progress": {
             "current_page": prog.get("current_page", 1),
@@ -422,7 +682,7 @@ def get_progress(pdf_id: str, user_id: str = Depends(get_current_user)):
 
 @app.get("/pdf/{pdf_id}/analysis")
 def get_analysis(pdf_id: str, user_id: str = Depends(get_current_user)):
-    _require_pdf(user_id, pdf_id)
+    info = _require_pdf(user_id, pdf_id)
 
     # Return cached analysis if available
     cached_row = db.get_analysis(user_id, pdf_id)
@@ -431,25 +691,24 @@ def get_analysis(pdf_id: str, user_id: str = Depends(get_current_user)):
         if "chapter_source" in cached:
             return {"analysis": cached}
 
-    # Generate analysis with 3-tier chapter detection
-    pdf_bytes = _download_pdf_bytes(user_id, pdf_id)
-    pages = extract_pages(pdf_bytes)
-
-    # Tier 1: PDF bookmarks (most accurate, instant)
-    chapters = extract_outline(pdf_bytes)
-    chapter_source = "bookmarks"
+    # Same PDF analyzed for another user (or before a re-upload)
+    content_hash = info.get("content_hash")
+    shared = _shared_analysis(content_hash)
+    if shared is not None:
+        _store_analysis(user_id, pdf_id, None, shared)
+        return {"analysis": shared}
 
-    # Tier 2: Text heuristics fallback
-    if not chapters:
-        chapters = detect_chapters_from_text(pages)
-        chapter_source = "heuristics"
+    # Generate analysis with 3-tier chapter detection; the PDF itself is
+    # only needed for its outline
+    pdf_bytes = _download_pdf_bytes(user_id, pdf_id)
+    pages = _get_pages_cached(user_id, pdf_id)
 
-    # Tier 3: AI fallback (chapters will be empty, AI detects them)
-    if not chapters:
-        chapter_source = "ai"
+    # Bookmarks, then text heuristics; "ai" means the model has to find chapters
+    chapters, chapter_source = detect_chapters(pdf_bytes, pages)
 
+    known_chapters = chapters if chapters else None
     try:
-        analysis = analyze_document(pages, known_chapters=chapters if chapters else None)
+        analysis = analyze_document(pages, known_chapters=known_chapters)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Analysis failed: {e}")
 
@@ -459,19 +718,19 @@ def get_analysis(pdf_id: str, user_id: str = Depends(get_current_user)):
 
     analysis["chapter_source"] = chapter_source
 
-    db.save_analysis(user_id, pdf_id, analysis, chapter_source=chapter_source)
+    _store_analysis(user_id, pdf_id, content_hash, analysis, analysis_result_key(pages, known_chapters))
     return {"analysis": analysis}
 
 
 # --- AI features (auth required) ---
 
 @app.post("/ask")
-def ask(req: AskRequest, user_id: str = Depends(get_current_user)):
+def ask(user_id: str = Depends(get_current_user), req: AskRequest = Depends(_json_body(AskRequest))):
     _require_pdf(user_id, req.pdf_id)
-    pdf_bytes = _download_pdf_bytes(user_id, req.pdf_id)
-    pages = extract_pages(pdf_bytes)
+    pages = _get_pages_cached(user_id, req.pdf_id)
+    index = _get_search_index(user_id, req.pdf_id)
     pages = get_page_range(pages, req.page_start, req.page_end)
-    chunks = find_relevant_chunks(pages, req.question)
+    chunks = find_relevant_chunks(pages, req.question, index=index)
     try:
         answer = ask_question(chunks, req.question, voice_mode=req.voice_mode)
     except Exception as e:
@@ -481,11 +740,41 @@ def ask(req: AskRequest, user_id: str = Depends(get_current_user)):
     return {"answer": answer, "cited_pages": cited_pages}
 
 
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {orjson.dumps(data).decode()}\n\n"
+
+
+@app.post("/ask/stream")
+def ask_stream(user_id: str = Depends(get_current_user), req: AskRequest = Depends(_json_body(AskRequest))):
+    """Server-sent events version of /ask: emits cited pages, then text deltas."""
+    _require_pdf(user_id, req.pdf_id)
+    pages = _get_pages_cached(user_id, req.pdf_id)
+    index = _get_search_index(user_id, req.pdf_id)
+    pages = get_page_range(pages, req.page_start, req.page_end)
+    chunks = find_relevant_chunks(pages, req.question, index=index)
+
+    def events():
+        yield _sse({"cited_pages": [c["page"] for c in chunks]}, event="meta")
+        try:
+            for text in ask_question_stream(chunks, req.question, voice_mode=req.voice_mode):
+                yield _sse({"text": text})
+        except Exception as e:
+            logger.error(f"[Ask stream] AI service error: {e}")
+            yield _sse({"detail": f"AI service error: {e}"}, event="error")
+            return
+        yield _sse({}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.post("/summarize")
-def summarize(req: SummarizeRequest, user_id: str = Depends(get_current_user)):
+def summarize(
+    user_id: str = Depends(get_current_user),
+    req: SummarizeRequest = Depends(_json_body(SummarizeRequest)),
+):
     _require_pdf(user_id, req.pdf_id)
-    pdf_bytes = _download_pdf_bytes(user_id, req.pdf_id)
-    pages = extract_pages(pdf_bytes)
+    pages = _get_pages_cached(user_id, req.pdf_id)
     pages = get_page_range(pages, req.page_start, req.page_end)
     try:
         summary = summarize_document(pages, voice_mode=req.voice_mode)
@@ -495,10 +784,12 @@ def summarize(req: SummarizeRequest, user_id: str = Depends(get_current_user)):
 
 
 @app.post("/recommend")
-def recommend(req: SummarizeRequest, user_id: str = Depends(get_current_user)):
+def recommend(
+    user_id: str = Depends(get_current_user),
+    req: SummarizeRequest = Depends(_json_body(SummarizeRequest)),
+):
     _require_pdf(user_id, req.pdf_id)
-    pdf_bytes = _download_pdf_bytes(user_id, req.pdf_id)
-    pages = extract_pages(pdf_bytes)
+    pages = _get_pages_cached(user_id, req.pdf_id)
     try:
         books = recommend_books(pages, voice_mode=req.voice_mode)
     except Exception as e:
@@ -508,28 +799,10 @@ def recommend(req: SummarizeRequest, user_id: str = Depends(get_current_user)):
 
 # --- TTS (auth required) ---
 
-# In-memory cache for extracted PDF pages (avoids re-parsing on every TTS call)
-_pages_cache: dict[str, tuple[float, list[dict]]] = {}
-
-def _get_pages_cached(user_id: str, pdf_id: str) -> list[dict]:
-    import time
-    cache_key = f"{user_id}/{pdf_id}"
-    now = time.time()
-    if cache_key in _pages_cache:
-        ts, pages = _pages_cache[cache_key]
-        if now - ts < 600:  # 10 min TTL
-            return pages
-    pdf_bytes = _download_pdf_bytes(user_id, pdf_id)
-    pages = extract_pages(pdf_bytes)
-    _pages_cache[cache_key] = (now, pages)
-    return pages
-
-
 # In-memory TTS job store
 _tts_jobs: dict[str, dict] = {}
 
 # Audio cache: hash(pdf_id+page+voice+rate) -> {audio_id, word_timings, text}
-import hashlib
 _audio_cache: dict[str, dict] = {}
 
 
@@ -556,10 +829,35 @@ async def _generate_single_page_tts(page_text: str, voice: str, rate: str):
     return b"".join(chunks), boundaries
 
 
+def _word_timings(boundaries: list[dict], offset: int = 0) -> list[dict]:
+    """Spread each sentence's duration over its words in proportion to their length.
+
+    Offsets are in Edge TTS units (10,000ths of a second); timings are in ms.
+    """
+    timings: list[dict] = []
+    for sent in boundaries:
+        words = sent["text"].split()
+        if not words:
+            continue
+        start_ms = (sent["offset"] + offset) / 10_000
+        # Cumulative character counts give each word's end as a fraction of the sentence
+        ends = list(accumulate(map(len, words)))
+        ms_per_char = sent["duration"] / 10_000 / ends[-1]
+        timings.extend(
+            {
+                "word": w,
+                "start": round(start_ms + (end - len(w)) * ms_per_char),
+                "end": round(start_ms + end * ms_per_char),
+            }
+            for w, end in zip(words, ends)
+        )
+    return timings
+
+
 async def _run_tts_job(job_id: str, user_id: str, req_data: dict):
     """Background coroutine that generates TTS audio with parallel page processing."""
     try:
-        pages = _get_pages_cached(user_id, req_data["pdf_id"])
+        pages = await asyncio.to_thread(_get_pages_cached, user_id, req_data["pdf_id"])
         end_page = min(req_data["start_page"] + req_data["num_pages"] - 1, len(pages))
         selected = [p for p in pages if req_data["start_page"] <= p["page"] <= end_page]
 
@@ -605,26 +903,13 @@ async def _run_tts_job(job_id: str, user_id: str, req_data: dict):
         )
 
         # Build word timings for first page
-        first_word_timings: list[dict] = []
-        first_cumulative = 0
-        for sent in first_boundaries:
-            end_offset = sent["offset"] + sent["duration"]
-            if end_offset > first_cumulative:
-                first_cumulative = end_offset
-            start_ms = sent["offset"] / 10_000
-            dur_ms = sent["duration"] / 10_000
-            words = sent["text"].split()
-            total_chars = max(sum(len(w) for w in words), 1)
-            cursor = start_ms
-            for w in words:
-                word_dur = dur_ms * (len(w) / total_chars)
-                first_word_timings.append({"word": w, "start": round(cursor), "end": round(cursor + word_dur)})
-                cursor += word_dur
+        first_word_timings = _word_timings(first_boundaries)
 
         # Upload first page audio so frontend can start playing immediately
         if len(page_texts) > 1:
             first_audio_id = str(uuid.uuid4())
-            db.upload_file(
+            await asyncio.to_thread(
+                db.upload_file,
                 db.BUCKET_AUDIO,
                 db.audio_object_path(first_audio_id),
                 first_audio,
@@ -653,32 +938,19 @@ async def _run_tts_job(job_id: str, user_id: str, req_data: dict):
 
         _tts_jobs[job_id] = {"status": "processing", "progress": 80}
 
-        # Concatenate all audio and build complete word timings
-        all_audio = b""
+        # Concatenate all audio (one copy, not one per page) and build complete word timings
+        all_audio = b"".join(audio_bytes for audio_bytes, _ in results)
         word_timings: list[dict] = []
         cumulative_offset = 0  # in Edge TTS units (10,000ths of second)
 
-        for audio_bytes, boundaries in results:
-            all_audio += audio_bytes
-            page_max_offset = 0
-            for sent in boundaries:
-                end_offset = sent["offset"] + sent["duration"]
-                if end_offset > page_max_offset:
-                    page_max_offset = end_offset
-                start_ms = (sent["offset"] + cumulative_offset) / 10_000
-                dur_ms = sent["duration"] / 10_000
-                words = sent["text"].split()
-                total_chars = max(sum(len(w) for w in words), 1)
-                cursor = start_ms
-                for w in words:
-                    word_dur = dur_ms * (len(w) / total_chars)
-                    word_timings.append({"word": w, "start": round(cursor), "end": round(cursor + word_dur)})
-                    cursor += word_dur
-            cumulative_offset += page_max_offset
+        for _, boundaries in results:
+            word_timings.extend(_word_timings(boundaries, cumulative_offset))
+            cumulative_offset += max((s["offset"] + s["duration"] for s in boundaries), default=0)
 
         audio_id = str(uuid.uuid4())
         # Upload full concatenated audio to Supabase Storage
-        db.upload_file(
+        await asyncio.to_thread(
+            db.upload_file,
             db.BUCKET_AUDIO,
             db.audio_object_path(audio_id),
             all_audio,
@@ -726,9 +998,12 @@ async def _run_tts_job(job_id: str, user_id: str, req_data: dict):
 
 
 @app.post("/tts")
-async def text_to_speech(req: TTSRequest, user_id: str = Depends(get_current_user)):
+async def text_to_speech(
+    user_id: str = Depends(get_current_user),
+    req: TTSRequest = Depends(_json_body(TTSRequest)),
+):
     """Starts TTS generation as a background job. Returns job_id immediately."""
-    _require_pdf(user_id, req.pdf_id)
+    await asyncio.to_thread(_require_pdf, user_id, req.pdf_id)
 
     job_id = str(uuid.uuid4())
     _tts_jobs[job_id] = {"status": "processing"}
@@ -795,21 +1070,16 @@ def explore_ebooks():
 
 @app.get("/explore/search")
 async def explore_search(q: str = ""):
-    import asyncio
     if not q.strip():
         return {"query": q, "results": [], "total": 0}
     local = search_books_local(q)
-    ol_results, gut_results = await asyncio.gather(
-        search_open_library(q, limit=20),
-        search_gutenberg(q, limit=15),
-    )
-    seen = set()
-    combined = []
-    for book in local + gut_results + ol_results:
-        key = book["title"].lower().strip()
-        if key not in seen:
-            seen.add(key)
-            combined.append(book)
+    external = await search_external(q, ol_limit=20, gut_limit=15)
+    # First occurrence of each title wins: curated, then Gutenberg, then Open Library
+    by_title: dict[str, dict] = {}
+    for results in (local, external):
+        for book in results:
+            by_title.setdefault(book["title"].casefold().strip(), book)
+    combined = list(by_title.values())
     return {"query": q, "results": combined, "total": len(combined)}
 
 
@@ -912,15 +1182,10 @@ async def import_explore_book(req: ImportBookRequest, user_id: str = Depends(get
         # Generate and upload thumbnail from first page
         has_thumbnail = False
         try:
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            page = doc[0]
-            pix = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
-            thumb_bytes = pix.tobytes("png")
-            doc.close()
             db.upload_file(
                 db.BUCKET_THUMBNAILS,
                 db.thumbnail_object_path(user_id, pdf_id),
-                thumb_bytes,
+                render_thumbnail(pdf_bytes, zoom=0.5),
                 content_type="image/png",
             )
             has_thumbnail = True
@@ -934,6 +1199,7 @@ async def import_explore_book(req: ImportBookRequest, user_id: str = Depends(get
             "file_size_bytes": len(pdf_bytes),
             "has_thumbnail": has_thumbnail,
             "source": "explore_import",
+            "content_hash": hashlib.sha256(pdf_bytes).hexdigest(),
             "original_title": req.title,
             "original_author": req.author,
             "cover_url": req.cover_url,
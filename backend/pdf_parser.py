@@ -1,26 +1,26 @@
-import pdfplumber
 import fitz  # PyMuPDF
 import re
-from io import BytesIO
+import math
 
 
 def extract_pages(pdf_bytes: bytes) -> list[dict]:
     """Extract text from each page of a PDF. Returns list of {page, text}."""
-    pages = []
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text() or ""
-            pages.append({"page": i, "text": text.strip()})
-    return pages
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [{"page": i, "text": page.get_text("text").strip()} for i, page in enumerate(doc, start=1)]
 
 
-def get_metadata(pdf_bytes: bytes) -> dict:
-    """Extract basic PDF metadata."""
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        return {
-            "total_pages": len(pdf.pages),
-            "metadata": pdf.metadata or {},
-        }
+def parse_pdf_once(pdf_bytes: bytes) -> tuple[list[dict], dict]:
+    """Open the PDF once for upload: returns (pages, metadata)."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pages = [{"page": i, "text": page.get_text("text").strip()} for i, page in enumerate(doc, start=1)]
+        metadata = {"total_pages": len(pages), "metadata": doc.metadata or {}}
+    return pages, metadata
+
+
+def render_thumbnail(pdf_bytes: bytes, zoom: float = 1.0) -> bytes:
+    """Render the first page as PNG bytes."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc[0].get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
 
 
 def extract_outline(pdf_bytes: bytes) -> list[dict]:
@@ -39,12 +39,27 @@ def extract_outline(pdf_bytes: bytes) -> list[dict]:
         return []
 
 
-# Patterns for detecting chapter headings in page text
-_CHAPTER_PATTERNS = [
-    re.compile(r"^(Chapter\s+(\d+|[IVXLCDM]+))\s*[:\-—]?\s*(.*)", re.IGNORECASE),
-    re.compile(r"^(Part\s+(\d+|[IVXLCDM]+))\s*[:\-—]?\s*(.*)", re.IGNORECASE),
-    re.compile(r"^(Section\s+\d+[\.\d]*)\s*[:\-—]?\s*(.*)", re.IGNORECASE),
-]
+# Chapter headings in page text, as one alternation so each line is scanned
+# once: "Chapter 3: ...", "Part IV ...", "Section 2.1 ...", and numbered
+# headings like "2.1 Background" (multi-level only, to skip list items;
+# case-sensitive so the title must be capitalized). Numbered headings are
+# section-number shaped: no leading zero and short components, so values
+# like "0.25" or "120.375" don't qualify.
+_CHAPTER_RE = re.compile(
+    r"^(?:(?P<chapter>(?:Chapter|Part)\s+(?:\d+|[IVXLCDM]+))\s*[:\-—]?\s*(?P<chapter_title>.*)"
+    r"|(?P<section>Section\s+\d+[\.\d]*)\s*[:\-—]?\s*(?P<section_title>.*)"
+    r"|(?-i:(?P<number>[1-9]\d?(?:\.\d{1,2})+)\s+(?P<number_title>[A-Z][^.]{2,60})$))",
+    re.IGNORECASE,
+)
+
+# A "number + capitalized word" line is an amount, not a heading, when the
+# word is a magnitude, currency or unit ("3.5 Million households", "12.50 USD")
+_AMOUNT_WORDS = frozenset(
+    "hundred thousand million billion trillion percent per "
+    "usd eur gbp jpy cny inr cad aud chf dollars euros pounds "
+    "kg mg km cm mm ml lb lbs oz ft kb mb gb tb hz khz mhz ghz "
+    "seconds minutes hours days weeks months years times points".split()
+)
 
 
 def detect_chapters_from_text(pages: list[dict]) -> list[dict]:
@@ -55,35 +70,111 @@ def detect_chapters_from_text(pages: list[dict]) -> list[dict]:
         if not text:
             continue
         lines = text.split("\n")[:8]  # Check first 8 lines of each page
-        for line in lines:
+        numbered_seen = False
+        for line_no, line in enumerate(lines):
             line = line.strip()
             if not line:
                 continue
-            # Check regex patterns
-            for pattern in _CHAPTER_PATTERNS:
-                m = pattern.match(line)
-                if m:
-                    # Build title from matched groups
-                    prefix = m.group(1).strip()
-                    rest = m.group(m.lastindex).strip() if m.lastindex and m.lastindex > 1 else ""
-                    title = f"{prefix}: {rest}" if rest and rest != prefix else prefix
-                    chapters.append({"title": title, "page": page_data["page"]})
-                    break
+            m = _CHAPTER_RE.match(line)
+            if m and m["number"]:
+                # At most one numbered heading per page; more usually means a table
+                if numbered_seen or m["number_title"].split()[0].lower() in _AMOUNT_WORDS:
+                    continue
+                numbered_seen = True
+            if m:
+                # Build title from matched groups
+                g = m.groupdict()
+                prefix = (g["chapter"] or g["section"] or g["number"]).strip()
+                rest = (g["chapter_title"] or g["section_title"] or g["number_title"] or "").strip()
+                title = f"{prefix}: {rest}" if rest and rest != prefix else prefix
+                chapters.append({"title": title, "page": page_data["page"]})
             else:
                 # Check for short ALL-CAPS lines (likely headings) — only on first 3 lines
-                if lines.index(line) < 3 and line.isupper() and 4 <= len(line) <= 60 and not line.startswith("PAGE"):
+                if line_no < 3 and line.isupper() and 4 <= len(line) <= 60 and not line.startswith("PAGE"):
                     chapters.append({"title": line.title(), "page": page_data["page"]})
     return chapters
 
 
-def find_relevant_chunks(pages: list[dict], query: str, top_k: int = 5) -> list[dict]:
-    """Simple keyword-based retrieval: score pages by query term overlap."""
-    query_terms = set(query.lower().split())
-    scored = []
+# Enough structure for analysis to skip AI chapter detection
+MIN_CHAPTERS = 3
+
+
+def detect_chapters(pdf_bytes: bytes, pages: list[dict]) -> tuple[list[dict], str]:
+    """Cheap chapter detection: PDF bookmarks first, then text heuristics.
+
+    Returns (chapters, source) where source is "bookmarks", "heuristics",
+    or "ai" when nothing was found and the model has to detect chapters.
+    """
+    chapters = extract_outline(pdf_bytes)
+    if len(chapters) >= MIN_CHAPTERS:
+        return chapters, "bookmarks"
+    # A sparse outline (e.g. just "Cover") shouldn't hide headings in the text
+    from_text = detect_chapters_from_text(pages)
+    if len(from_text) > len(chapters):
+        return from_text, "heuristics"
+    if chapters:
+        return chapters, "bookmarks"
+    return [], "ai"
+
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+
+def build_search_index(pages: list[dict]) -> dict[str, dict[int, float]]:
+    """TF-IDF index over a document's pages: term -> {page number: weight}.
+
+    Weights are sublinear tf * idf, normalized per page, so a query scores a
+    page by summing the weights of its terms. Build once per document.
+    """
+    page_tfs = []
+    df: dict[str, int] = {}
     for page in pages:
-        page_terms = set(page["text"].lower().split())
-        overlap = len(query_terms & page_terms)
-        if overlap > 0 or not query_terms:
-            scored.append((overlap, page))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [page for _, page in scored[:top_k]]
+        tf: dict[str, int] = {}
+        for term in _TERM_RE.findall(page["text"].lower()):
+            tf[term] = tf.get(term, 0) + 1
+        page_tfs.append((page["page"], tf))
+        for term in tf:
+            df[term] = df.get(term, 0) + 1
+
+    n = len(pages)
+    idf = {term: math.log((1 + n) / (1 + c)) + 1 for term, c in df.items()}
+    index: dict[str, dict[int, float]] = {}
+    for page_no, tf in page_tfs:
+        weights = {term: (1 + math.log(c)) * idf[term] for term, c in tf.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        for term, w in weights.items():
+            index.setdefault(term, {})[page_no] = w / norm
+    return index
+
+
+def find_relevant_chunks(
+    pages: list[dict],
+    query: str,
+    top_k: int = 5,
+    index: dict[str, dict[int, float]] | None = None,
+) -> list[dict]:
+    """TF-IDF retrieval: rank pages by the query's term weights.
+
+    `index` is the document's build_search_index() result, which may cover
+    more pages than `pages` (e.g. a page range); built on the fly if omitted.
+    """
+    query_terms = set(_TERM_RE.findall(query.lower()))
+    if not query_terms or not pages:
+        return pages[:top_k]
+    if index is None:
+        index = build_search_index(pages)
+    first, last = pages[0]["page"], pages[-1]["page"]
+    if last - first == len(pages) - 1:
+        # Extracted pages (and their ranges) are numbered consecutively, so a
+        # page's position follows from its number; no per-question lookup table
+        def lookup(page_no: int) -> dict | None:
+            return pages[page_no - first] if first <= page_no <= last else None
+    else:
+        lookup = {page["page"]: page for page in pages}.get
+    scores: dict[int, float] = {}
+    for term in query_terms:
+        for page_no, w in index.get(term, {}).items():
+            if lookup(page_no) is not None:
+                scores[page_no] = scores.get(page_no, 0.0) + w
+    ranked = sorted(scores, key=lambda page_no: (-scores[page_no], page_no))
+    return [lookup(page_no) for page_no in ranked[:top_k]]
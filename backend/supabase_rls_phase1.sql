@@ -58,6 +58,14 @@ CREATE POLICY "analysis_select_own"
     AND user_id = auth.jwt() ->> 'sub'
   );
 
+-- ============================================================
+-- AI_RESULTS — backend only. Rows are keyed by content hash and shared
+-- across users (summaries, analyses of other users' PDFs), so the browser
+-- must neither read them nor write fake entries for others to be served.
+-- RLS with no policies denies anon/authenticated; service_role bypasses it.
+-- ============================================================
+ALTER TABLE ai_results ENABLE ROW LEVEL SECURITY;
+
 -- ============================================================
 -- USERS / SUBSCRIPTIONS — leave RLS off for now; only backend touches them.
 -- If you later want the browser to read subscription tier directly, add:
@@ -44,9 +44,13 @@ CREATE TABLE IF NOT EXISTS pdfs (
   cover_url TEXT,
   description TEXT,
   tags TEXT[] DEFAULT '{}',
+  content_hash TEXT,  -- SHA-256 of the PDF bytes; keys shared AI results
   uploaded_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Existing databases
+ALTER TABLE pdfs ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 CREATE INDEX IF NOT EXISTS idx_pdfs_user_id ON pdfs(user_id);
 CREATE INDEX IF NOT EXISTS idx_pdfs_uploaded_at ON pdfs(user_id, uploaded_at DESC);
 
@@ -78,6 +82,20 @@ CREATE TABLE IF NOT EXISTS pdf_analysis (
 
 CREATE INDEX IF NOT EXISTS idx_analysis_user ON pdf_analysis(user_id);
 
+-- ============================================================
+-- AI_RESULTS — summaries/analyses keyed by document content hash
+-- ============================================================
+CREATE TABLE IF NOT EXISTS ai_results (
+  cache_key TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  result JSONB NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Shared across users: RLS on with no policies, so only the backend's
+-- service_role key can read or write it (see supabase_rls_phase1.sql)
+ALTER TABLE ai_results ENABLE ROW LEVEL SECURITY;
+
 -- ============================================================
 -- DONE
 -- ============================================================